@@ -0,0 +1,131 @@
+import datetime
+import math
+import os
+import sqlite3
+import threading
+import time
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+import ohlcv_cache
+
+# --- CACHE JAWABAN AI (SQLITE + TTL) ---
+# Jawaban Gemini disimpan per jenis prompt (kind) + ticker + input yang sudah di-bucket
+# (band harga, band kenaikan, tanggal bursa). Saham yang muncul lagi 15 menit kemudian
+# dengan harga hampir sama tidak perlu bayar panggilan AI baru.
+
+load_dotenv()
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "1") != "0"
+AI_CACHE_MAX_ROWS = int(os.getenv("AI_CACHE_MAX_ROWS", "5000"))
+
+# TTL default per jenis prompt (detik), bisa di-override: AI_CACHE_TTL_<KIND>=...
+DEFAULT_TTLS = {
+    'gainer': 3 * 3600,
+    'sentiment': 3600,
+    'swing': 6 * 3600,
+}
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def ttl_for(kind):
+    return int(os.getenv(f"AI_CACHE_TTL_{kind.upper()}", DEFAULT_TTLS.get(kind, 3600)))
+
+
+def _connect():
+    os.makedirs(ohlcv_cache.CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(ohlcv_cache.CACHE_DIR, "ai_cache.sqlite"), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    """)
+    return conn
+
+
+def _count(kind, field):
+    with _lock:
+        _stats.setdefault(kind, {'hits': 0, 'misses': 0})[field] += 1
+
+
+# --- BUCKETING INPUT ---
+def price_band(price, pct=1.0):
+    """Band harga logaritmik: harga yang beda < pct% masuk band yang sama."""
+    if not price or price <= 0 or math.isnan(price):
+        return 0
+    return int(math.floor(math.log(price) / math.log1p(pct / 100)))
+
+
+def change_band(change_pct, step=0.5):
+    return int(math.floor(change_pct / step))
+
+
+def trading_date():
+    return datetime.datetime.now(ZoneInfo("Asia/Jakarta")).date().isoformat()
+
+
+def make_key(kind, *parts):
+    return "|".join([kind] + [str(p) for p in parts])
+
+
+def get(kind, *parts):
+    """Return jawaban yang masih berlaku, atau None (miss)."""
+    if not AI_CACHE_ENABLED:
+        return None
+    key = make_key(kind, *parts)
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                row = conn.execute("SELECT value FROM responses WHERE key = ? AND expires_at > ?",
+                                   (key, now)).fetchone()
+                if row:
+                    conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"   ⚠️ AI cache error: {e}")
+        row = None
+
+    _count(kind, 'hits' if row else 'misses')
+    return row[0] if row else None
+
+
+def put(kind, value, *parts):
+    """Simpan jawaban; entri kadaluarsa dibuang dan ukuran tabel dijaga <= AI_CACHE_MAX_ROWS (LRU)."""
+    if not AI_CACHE_ENABLED or not value:
+        return
+    key = make_key(kind, *parts)
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO responses (key, kind, value, expires_at, last_access) "
+                             "VALUES (?, ?, ?, ?, ?)", (key, kind, value, now + ttl_for(kind), now))
+                conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                excess = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - AI_CACHE_MAX_ROWS
+                if excess > 0:
+                    conn.execute("DELETE FROM responses WHERE key IN "
+                                 "(SELECT key FROM responses ORDER BY last_access LIMIT ?)", (excess,))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"   ⚠️ AI cache error: {e}")
+
+
+def stats():
+    """Hit/miss per kind sejak proses mulai."""
+    with _lock:
+        return {kind: dict(counts) for kind, counts in _stats.items()}
+
+
+def stats_line():
+    parts = [f"{kind} {c['hits']} hit / {c['misses']} miss" for kind, c in sorted(stats().items())]
+    return ", ".join(parts) if parts else "tidak dipakai"
@@ -0,0 +1,96 @@
+import contextvars
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from rate_limit import TokenBucket
+import metrics
+
+# --- LAPISAN AI: PARALEL + RATE LIMIT (TOKEN BUCKET) ---
+# Semua panggilan Gemini lewat generate() supaya:
+# 1. Jumlah request per menit dibatasi oleh satu token bucket bersama
+# 2. Hanya panggilan yang kena 429 yang mundur (backoff + jitter), sisanya jalan terus
+
+load_dotenv()
+AI_MAX_RPM = float(os.getenv("AI_MAX_RPM", "10"))
+AI_BURST = float(os.getenv("AI_BURST", "2"))
+AI_MAX_WORKERS = int(os.getenv("AI_MAX_WORKERS", "4"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "3"))
+AI_BACKOFF_BASE = float(os.getenv("AI_BACKOFF_BASE", "2"))
+AI_BACKOFF_MAX = float(os.getenv("AI_BACKOFF_MAX", "60"))
+
+limiter = TokenBucket(AI_MAX_RPM, capacity=AI_BURST)
+
+_RETRY_HINT = re.compile(r"retry(?:Delay)?['\"]?\s*[:=]?\s*['\"]?(?:in\s+)?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+
+def is_throttled(error):
+    """Kuota habis / rate limit (HTTP 429)."""
+    msg = str(error)
+    return "429" in msg or "RESOURCE_EXHAUSTED" in msg
+
+
+def is_transient(error):
+    """Error sementara yang layak dicoba ulang: 429 atau server Gemini sibuk."""
+    msg = str(error)
+    return is_throttled(error) or any(code in msg for code in ("500", "503", "UNAVAILABLE", "DEADLINE_EXCEEDED"))
+
+
+def backoff_delay(attempt, error=None):
+    """Exponential backoff dengan full jitter; pakai retryDelay dari server kalau ada."""
+    delay = random.uniform(0, min(AI_BACKOFF_MAX, AI_BACKOFF_BASE * (2 ** attempt)))
+    match = _RETRY_HINT.search(str(error)) if error is not None else None
+    if match:
+        delay = max(delay, min(AI_BACKOFF_MAX, float(match.group(1))))
+    return delay
+
+
+def generate(client, model, contents, config=None, max_retries=AI_MAX_RETRIES, label=""):
+    """
+    Panggil client.models.generate_content dengan rate limit & retry.
+    Error yang tidak bisa di-retry (atau retry habis) dilempar ke pemanggil.
+    """
+    for attempt in range(max_retries):
+        waited = limiter.acquire()
+        if waited:
+            metrics.observe('ai_rate_limit_wait_seconds', waited)
+        started = time.perf_counter()
+        try:
+            response = client.models.generate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            outcome = "throttled" if is_throttled(e) else "error"
+            metrics.observe('ai_request_seconds', time.perf_counter() - started, model=model, outcome=outcome)
+            if outcome == "throttled":
+                metrics.inc('ai_throttled_total', model=model)
+            if not is_transient(e) or attempt == max_retries - 1:
+                raise
+            metrics.inc('ai_retries_total', model=model)
+            delay = backoff_delay(attempt, e)
+            reason = "Kuota Limit" if is_throttled(e) else "Server Sibuk"
+            print(f"   ⏳ {reason} {label}! Menunggu {delay:.1f} detik... ({attempt+1}/{max_retries})")
+            time.sleep(delay)
+            continue
+        metrics.observe('ai_request_seconds', time.perf_counter() - started, model=model, outcome="ok")
+        return response
+
+
+def response_text(response):
+    """Ambil teks jawaban pertama, atau None kalau kosong."""
+    if response is not None and response.candidates and response.candidates[0].content.parts:
+        text = response.candidates[0].content.parts[0].text
+        if text:
+            return text.strip()
+    return None
+
+
+def run_concurrent(fn, items, max_workers=AI_MAX_WORKERS):
+    """Jalankan fn(item) untuk semua item secara paralel, hasil tetap urut sesuai input."""
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        # Konteks disalin per item supaya metrik tetap tercatat ke run scanner yang memanggil
+        futures = [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import indicators
+import screens
+
+# --- BACKTEST VEKTOR ATURAN SWING SCREEN ---
+# Screen 'portfolio' dari screens.json (yang dipakai scan_local_portfolio, bawaan: harga > MA20,
+# RSI 40-65, rata-rata volume 20 hari > 500k) diputar ulang di SEMUA tanggal & ticker sekaligus dengan operasi array
+# NumPy (tanpa loop per hari). Ticker dibagi ke beberapa proses (shard).
+# Contoh: python backtest.py --universe tickers.txt --period 10y --horizons 5,10,20
+
+VOLUME_GROUPS = {0: indicators.NORMAL_VOLUME, 1: indicators.HIGH_VOLUME, 2: indicators.LOW_VOLUME}
+
+
+def signal_mask(close, ind, bars):
+    """Cocok dengan minimal 1 screen 'portfolio' (sama dengan screens.apply), untuk setiap (tanggal, ticker)."""
+    prev_close = np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cols = {'price': close, 'change_pct': (close - prev_close) / prev_close * 100, 'bars': bars,
+                **{name: ind[name] for name in ('ma20', 'rsi', 'vol_avg', 'vol_ratio', 'shadow_ratio')}}
+    matched = np.zeros(close.shape, dtype=bool)
+    for screen in screens.load('portfolio'):
+        matched |= np.broadcast_to(screen.fn(cols), close.shape)
+    return matched & (bars >= indicators.MIN_BARS)
+
+
+def _scatter(order, values):
+    """Kembalikan array hasil align_last_bars ke baris (tanggal) aslinya."""
+    out = np.empty_like(values)
+    np.put_along_axis(out, order, values, axis=0)
+    return out
+
+
+def evaluate_shard(open_, high, low, close, volume, horizons):
+    """
+    Hitung semua sinyal + hasil ke depan untuk satu shard ticker.
+    Return dict per horizon berisi array per sinyal (digabung di proses utama).
+    """
+    # Sama dengan scanner: tiap ticker dihitung dari bar miliknya sendiri, jadi tanggal tanpa bar
+    # (suspend / libur) tidak membuat MA20/RSI jadi NaN dan horizon h = h bar valid berikutnya.
+    order, filled, (open_, high, low, close, volume) = indicators.align_last_bars(
+        np.isfinite(close), open_, high, low, close, volume)
+    ind = indicators.compute_indicators(open_, high, low, close, volume)
+    bars = np.cumsum(filled, axis=0)
+    signals = signal_mask(close, ind, bars)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vol_group = np.select([ind['vol_ratio'] > 1.2, ind['vol_ratio'] < 0.8], [1, 2], 0)
+        shadow_warn = ind['shadow_ratio'] > 0.4
+        # Risiko kalau stop loss di MA20 (negatif): seberapa jauh harga bisa turun sebelum keluar
+        stop_risk = ind['ma20'] / close - 1
+
+    out = {'signals_total': int(signals.sum())}
+    for h in horizons:
+        n = len(close)
+        fwd = np.full(close.shape, np.nan)
+        worst_low = np.full(close.shape, np.nan)
+        if n > h:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                fwd[:-h] = close[h:] / close[:-h] - 1
+            # Low terendah di bar t+1 .. t+h (maximum adverse excursion).
+            # Loop hanya sepanjang horizon (geser array), bukan per hari.
+            for offset in range(1, h + 1):
+                worst_low[:-offset] = np.fmin(worst_low[:-offset], low[offset:])
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stop_hit = worst_low < ind['ma20']
+            mae = worst_low / close - 1
+        # Kalau MA20 tersentuh, hasil dianggap keluar di MA20; kalau tidak, pegang sampai t+h
+        realized = np.where(stop_hit, stop_risk, fwd)
+
+        # Sinyal dikembalikan ke urutan (tanggal, ticker) asli sebelum diambil
+        valid = _scatter(order, signals & np.isfinite(fwd))
+        out[h] = {
+            'fwd': _scatter(order, fwd)[valid],
+            'realized': _scatter(order, realized)[valid],
+            'stop_hit': _scatter(order, stop_hit)[valid],
+            'stop_risk': _scatter(order, stop_risk)[valid],
+            'mae': _scatter(order, mae)[valid],
+            'vol_group': _scatter(order, vol_group)[valid],
+            'shadow_warn': _scatter(order, shadow_warn)[valid],
+        }
+    return out
+
+
+def _shard_worker(args):
+    arrays, horizons = args
+    return evaluate_shard(*arrays, horizons)
+
+
+def _summary(part):
+    fwd = part['fwd']
+    if len(fwd) == 0:
+        return {'signals': 0}
+    return {
+        'signals': int(len(fwd)),
+        'hit_rate': float((fwd > 0).mean()),
+        'mean_return': float(fwd.mean()),
+        'median_return': float(np.median(fwd)),
+        'stop_hit_rate': float(part['stop_hit'].mean()),
+        'mean_return_with_ma20_stop': float(part['realized'].mean()),
+        'mean_ma20_stop_risk': float(np.nanmean(part['stop_risk'])),
+        'worst_ma20_stop_risk': float(np.nanmin(part['stop_risk'])),
+        'mean_mae': float(np.nanmean(part['mae'])),
+        'worst_mae': float(np.nanmin(part['mae'])),
+    }
+
+
+def _subset(part, mask):
+    return {key: values[mask] for key, values in part.items()}
+
+
+def run_backtest(history, horizons=(5, 10, 20), workers=None, shards=None):
+    """
+    history: frame kolom MultiIndex (field, ticker), misal dari ohlcv_cache.get_history.
+    Return dict laporan per horizon (+ breakdown label volume & shadow).
+    """
+    close_frame = history['Close']
+    history = history.loc[close_frame.notna().any(axis=1)]
+    tickers = list(close_frame.columns)
+    fields = [history[f].reindex(columns=tickers).to_numpy(dtype=float)
+              for f in ('Open', 'High', 'Low', 'Close', 'Volume')]
+
+    workers = workers or os.cpu_count() or 1
+    shards = max(1, min(shards or workers, len(tickers)))
+    bounds = np.linspace(0, len(tickers), shards + 1).astype(int)
+    jobs = [([a[:, lo:hi] for a in fields], tuple(horizons)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_shard_worker, jobs))
+    else:
+        results = [_shard_worker(job) for job in jobs]
+
+    report = {
+        'tickers': len(tickers),
+        'days': int(len(history)),
+        'start': str(history.index[0].date()) if len(history) else None,
+        'end': str(history.index[-1].date()) if len(history) else None,
+        'signals_total': sum(r['signals_total'] for r in results),
+        'horizons': {},
+    }
+    for h in horizons:
+        part = {key: np.concatenate([r[h][key] for r in results]) for key in results[0][h]}
+        report['horizons'][str(h)] = {
+            'all': _summary(part),
+            'by_volume': {label: _summary(_subset(part, part['vol_group'] == code))
+                          for code, label in VOLUME_GROUPS.items()},
+            'by_shadow': {
+                indicators.SHADOW_WARNING: _summary(_subset(part, part['shadow_warn'])),
+                indicators.SHADOW_OK: _summary(_subset(part, ~part['shadow_warn'])),
+            },
+        }
+    return report
+
+
+def print_report(report):
+    print("\n" + "=" * 60)
+    print(f"   📈 BACKTEST SWING SCREEN: {report['tickers']} ticker, {report['days']} hari "
+          f"({report['start']} s/d {report['end']})")
+    print("=" * 60)
+    print(f"Total sinyal: {report['signals_total']}")
+    for h, data in report['horizons'].items():
+        s = data['all']
+        if not s['signals']:
+            print(f"\n⏱️ Horizon {h} hari: tidak ada sinyal")
+            continue
+        print(f"\n⏱️ Horizon {h} hari ({s['signals']} sinyal)")
+        print(f"   Hit rate            : {s['hit_rate']*100:.1f}%")
+        print(f"   Return rata-rata    : {s['mean_return']*100:+.2f}% (median {s['median_return']*100:+.2f}%)")
+        print(f"   Kena stop MA20      : {s['stop_hit_rate']*100:.1f}%")
+        print(f"   Return pakai stop   : {s['mean_return_with_ma20_stop']*100:+.2f}%")
+        print(f"   Risiko stop MA20    : rata-rata {s['mean_ma20_stop_risk']*100:.2f}%, "
+              f"terburuk {s['worst_ma20_stop_risk']*100:.2f}%")
+        print(f"   Drawdown (MAE)      : rata-rata {s['mean_mae']*100:.2f}%, terburuk {s['worst_mae']*100:.2f}%")
+        for label, v in data['by_volume'].items():
+            if v['signals']:
+                print(f"   {label:<28}: {v['signals']:>6} sinyal | hit {v['hit_rate']*100:.1f}% "
+                      f"| return {v['mean_return']*100:+.2f}%")
+
+
+def _load_tickers(args):
+    tickers = []
+    if args.tickers:
+        tickers += [t.strip() for t in args.tickers.split(",") if t.strip()]
+    if args.universe:
+        with open(args.universe) as f:
+            tickers += [line.split(",")[0].strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(dict.fromkeys(tickers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest screen 'portfolio' (screens.json) scan_local_portfolio")
+    parser.add_argument("--universe", help="File daftar ticker (1 per baris)")
+    parser.add_argument("--tickers", help="Daftar ticker dipisah koma, misal BBRI.JK,TLKM.JK")
+    parser.add_argument("--period", default="10y", help="Periode data harian (default 10y)")
+    parser.add_argument("--horizons", default="5,10,20", help="Horizon hari ke depan (default 5,10,20)")
+    parser.add_argument("--workers", type=int, default=None, help="Jumlah proses (default: jumlah core)")
+    parser.add_argument("--json", dest="json_path", help="Simpan laporan ke file JSON")
+    args = parser.parse_args()
+
+    tickers = _load_tickers(args)
+    if not tickers:
+        parser.error("Isi --universe atau --tickers")
+
+    import ohlcv_cache
+
+    started = time.perf_counter()
+    history, errors = ohlcv_cache.get_history(tickers, period=args.period, interval='1d')
+    for ticker, err in errors.items():
+        print(f"   ⚠️ {ticker}: {err}")
+    loaded = time.perf_counter()
+
+    report = run_backtest(history, [int(h) for h in args.horizons.split(",")], workers=args.workers)
+    finished = time.perf_counter()
+    report['seconds'] = {'load': round(loaded - started, 3), 'backtest': round(finished - loaded, 3)}
+
+    print_report(report)
+    print(f"\n⏱️ Data {report['seconds']['load']} detik, backtest {report['seconds']['backtest']} detik")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
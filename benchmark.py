@@ -0,0 +1,441 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+# --- BENCHMARK OFFLINE END-TO-END ---
+# scan_top_gainers & scan_local_portfolio dijalankan penuh tanpa jaringan:
+# 1. yfinance  -> fixture OHLCV rekaman (atau data sintetis kalau fixture belum ada)
+# 2. Gemini    -> model palsu dengan latency & rasio 429 yang bisa diatur
+# 3. Telegram  -> server HTTP lokal (sink)
+# 4. Postgres  -> SQLite di folder sementara
+# Waktu per tahap (fetch, indicators, filter, ai, persistence, notification) ditulis ke JSON,
+# per ukuran universe dan per jumlah proses shard (--workers, default 1 dan jumlah CPU).
+# Contoh:
+#   python benchmark.py --record bench_fixtures.csv.gz          (sekali, butuh internet)
+#   python benchmark.py --fixtures bench_fixtures.csv.gz --out hasil.json
+#   python benchmark.py --fixtures bench_fixtures.csv.gz --baseline hasil.json
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+DEFAULT_SIZES = "50,500,2000"
+
+
+# --- 1. DATA PASAR (FIXTURE) ---
+def record_fixtures(path, period='1y'):
+    """Download OHLCV asli untuk universe default lalu simpan sebagai fixture (format panjang)."""
+    import ohlcv_cache
+    import scanner
+    import scanner_pribadi
+
+    tickers = list(dict.fromkeys(scanner.DAFTAR_50 + scanner_pribadi.WATCHLIST))
+    frame, errors = ohlcv_cache.download_batch(tickers, period=period, interval='1d')
+    for ticker, err in errors.items():
+        print(f"   ⚠️ {ticker}: {err}")
+    save_panel(frame, path)
+    print(f"💾 Fixture {len(tickers) - len(errors)} ticker x {len(frame)} hari -> {path}")
+
+
+def save_panel(frame, path):
+    tickers = list(frame['Close'].columns)
+    long = pd.DataFrame({
+        'Date': np.repeat(frame.index.to_numpy(), len(tickers)),
+        'Ticker': np.tile(tickers, len(frame)),
+        **{f: frame[f].reindex(columns=tickers).to_numpy(dtype=float).ravel() for f in FIELDS},
+    })
+    long.dropna(subset=['Close']).to_csv(path, index=False)
+
+
+def load_panel(path):
+    long = pd.read_csv(path, parse_dates=['Date'])
+    frame = long.pivot(index='Date', columns='Ticker', values=FIELDS)
+    return frame.sort_index()
+
+
+def synthetic_panel(n_tickers=50, days=260, seed=7):
+    """Random walk OHLCV sintetis kalau fixture rekaman belum ada."""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    tickers = [f"SYN{i:04d}.JK" for i in range(n_tickers)]
+    base = rng.uniform(100, 10000, n_tickers)
+    close = base * np.exp(np.cumsum(rng.normal(0.0005, 0.02, (days, n_tickers)), axis=0))
+    open_ = close * np.exp(rng.normal(0, 0.01, close.shape))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, close.shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, close.shape)))
+    volume = rng.lognormal(14, 1, close.shape).round()
+    arrays = {'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}
+    return pd.concat({f: pd.DataFrame(arrays[f], index=index, columns=tickers) for f in FIELDS}, axis=1)
+
+
+def align_to_today(panel):
+    """Geser tanggal fixture supaya bar terakhir = hari bursa terakhir (period '5d'/'6mo' tetap kena)."""
+    last_bday = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=1)[0]
+    panel = panel.copy()
+    panel.index = pd.bdate_range(end=last_bday, periods=len(panel))
+    return panel
+
+
+def expand_panel(panel, n, seed=11):
+    """
+    Perbesar universe ke n ticker: ticker asli dipakai dulu, sisanya klon yang harganya
+    digeser random walk kecil (deterministik) supaya hasil screen tidak identik.
+    """
+    base = list(panel['Close'].columns)
+    if n <= len(base):
+        return panel.loc[:, (slice(None), base[:n])]
+
+    rng = np.random.default_rng(seed)
+    clones = n - len(base)
+    source = [base[i % len(base)] for i in range(clones)]
+    names = [f"{t.split('.')[0]}{i:04d}.JK" for i, t in enumerate(source)]
+    drift = np.exp(np.cumsum(rng.normal(0, 0.01, (len(panel), clones)), axis=0))
+    scale = rng.uniform(0.5, 2.0, clones)
+
+    frames = {}
+    for field in FIELDS:
+        values = panel[field][source].to_numpy(dtype=float)
+        values = values * (scale if field == 'Volume' else drift)
+        extra = pd.DataFrame(values, index=panel.index, columns=names)
+        frames[field] = pd.concat([panel[field][base], extra], axis=1)
+    return pd.concat(frames, axis=1)
+
+
+class FakeYFinance:
+    """Pengganti modul yfinance: hanya download() yang dipakai ohlcv_cache."""
+
+    def __init__(self, panel, latency=0.0, per_ticker=0.0):
+        self.panel = panel
+        self.latency = latency
+        self.per_ticker = per_ticker
+        self.calls = 0
+
+    @staticmethod
+    def _parse_start(start):
+        """Kontrak start yfinance: string '%Y-%m-%d', datetime / date, atau epoch int (detik)."""
+        import ohlcv_cache
+
+        try:
+            # Pakai parser yfinance sendiri kalau terpasang, supaya argumen yang ditolak
+            # yfinance asli juga gagal di sini
+            from yfinance.utils import _parse_user_dt
+        except ImportError:
+            _parse_user_dt = None
+        if _parse_user_dt is not None:
+            parsed = _parse_user_dt(start, ohlcv_cache.MARKET_TZ)
+            return pd.Timestamp(parsed).tz_convert(ohlcv_cache.MARKET_TZ).tz_localize(None)
+
+        if isinstance(start, int):
+            return pd.Timestamp(start, unit='s', tz='UTC').tz_convert(ohlcv_cache.MARKET_TZ).tz_localize(None)
+        if isinstance(start, str):
+            # Sama dengan yfinance: string dengan jam -> ValueError "unconverted data remains"
+            return pd.Timestamp(datetime.datetime.strptime(start, '%Y-%m-%d'))
+        if isinstance(start, datetime.date):
+            start = pd.Timestamp(start)
+            return start.tz_convert(ohlcv_cache.MARKET_TZ).tz_localize(None) if start.tz is not None else start
+        raise ValueError(f"Unable to parse input dt {start} of type {type(start)}")
+
+    def _intraday(self, tickers):
+        """Satu bar 'sesi hari ini' per ticker: close harian terakhir + drift tetap per ticker (-3%..+7%)."""
+        import ohlcv_cache
+
+        last = self.panel.iloc[[-1]].reindex(columns=pd.MultiIndex.from_product([FIELDS, tickers]))
+        drift = np.array([1 + (zlib.crc32(t.encode()) % 1000) / 10000 - 0.03 for t in tickers])
+        for field in ('Open', 'High', 'Low', 'Close'):
+            last[field] = last[field].to_numpy() * drift
+        last.index = [pd.Timestamp.now(tz=ohlcv_cache.MARKET_TZ).tz_localize(None).floor('min')]
+        return last
+
+    def download(self, tickers, period=None, start=None, interval='1d', **kwargs):
+        import ohlcv_cache
+
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        self.calls += 1
+        time.sleep(self.latency + self.per_ticker * len(tickers))
+        start = self._parse_start(start) if start is not None else ohlcv_cache.period_start(period or '1mo')
+        panel = self._intraday(tickers) if interval[-1] in 'mh' else self.panel
+        window = panel.loc[panel.index >= start]
+        return window.reindex(columns=pd.MultiIndex.from_product([FIELDS, tickers]))
+
+
+def install_worker_fakes(panel_path, latency, per_ticker, cache_dir):
+    """
+    Initializer process pool sharding: worker dibuat lewat forkserver / spawn, jadi patch
+    di proses utama tidak ikut. yfinance palsu & CACHE_DIR dipasang ulang di tiap worker.
+    """
+    import ohlcv_cache
+
+    ohlcv_cache.yf = FakeYFinance(pd.read_pickle(panel_path), latency, per_ticker)
+    ohlcv_cache.CACHE_DIR = cache_dir
+
+
+# --- 2. MODEL AI PALSU ---
+class FakeModels:
+    def __init__(self, latency, jitter, rate_429, seed):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            throttled = self.rng.random() < self.rate_429
+            self.throttled += throttled
+        time.sleep(delay)
+        if throttled:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED (benchmark)")
+
+        tickers = re.findall(r"- (\S+) \| Harga", contents)
+        if tickers and "JSON" in contents:
+            text = json.dumps([{"ticker": t, "komentar": "Momentum beli kuat (benchmark)."} for t in tickers])
+        elif "PARAMETER" in contents:
+            text = "| PARAMETER | VALUE |\n| :--- | :--- |\n| 🎯 ACTION | 🔴 WAIT |\n| 📝 ALASAN | Benchmark |"
+        else:
+            text = "Pasar netral (benchmark)."
+        part = SimpleNamespace(text=text)
+        return SimpleNamespace(text=text, candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+# --- 3. SINK TELEGRAM ---
+class TelegramSink(BaseHTTPRequestHandler):
+    messages = 0
+    latency = 0.0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(TelegramSink.latency)
+        with TelegramSink.lock:
+            TelegramSink.messages += 1
+        body = b'{"ok": true, "result": {}}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_sink(latency):
+    TelegramSink.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TelegramSink)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- 4. JALANKAN SKENARIO ---
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix="stockvision-bench-")
+    sink = start_sink(args.sink_latency)
+
+    # Harus di-set SEBELUM scanner di-import (konfigurasi dibaca saat import)
+    os.environ.update({
+        'DB_URL': f"sqlite:///{os.path.join(workdir, 'signals.sqlite')}",
+        'TELEGRAM_API_URL': f"http://127.0.0.1:{sink.server_address[1]}",
+        'TELEGRAM_TOKEN': 'benchmark',
+        'TELEGRAM_CHAT_ID': '1',
+        'TELEGRAM_MSGS_PER_MINUTE': '60000',
+        'TELEGRAM_BURST': '1000',
+        'GEMINI_API_KEY': 'benchmark',
+        'GEMINI_API_KEY_PRIBADI': 'benchmark',
+        'GAINER_MODE': 'daily',
+        'AI_MAX_RPM': str(args.llm_rpm),
+        'AI_BURST': str(max(1, args.llm_rpm // 60)),
+        'CACHE_DIR': os.path.join(workdir, 'cache'),
+    })
+
+    import ohlcv_cache
+    import scanner
+    import scanner_pribadi
+    import sharding
+
+    models = FakeModels(args.llm_latency, args.llm_jitter, args.llm_429_rate, args.seed)
+    scanner.client = scanner_pribadi.client = SimpleNamespace(models=models)
+
+    if args.fixtures and os.path.exists(args.fixtures):
+        base = load_panel(args.fixtures)
+        source = args.fixtures
+    else:
+        if args.fixtures:
+            print(f"⚠️ Fixture {args.fixtures} tidak ada, pakai data sintetis.")
+        base = synthetic_panel(seed=args.seed)
+        source = "synthetic"
+    base = align_to_today(base)
+
+    def scan_top_gainers_intraday(tickers):
+        # GAINER_MODE dibaca saat scan, jadi cukup diganti selama run ini
+        scanner.GAINER_MODE = 'intraday'
+        try:
+            return scanner.scan_top_gainers(tickers)
+        finally:
+            scanner.GAINER_MODE = 'daily'
+
+    scans = {'scan_top_gainers': scanner.scan_top_gainers,
+             'scan_top_gainers_intraday': scan_top_gainers_intraday,
+             'scan_local_portfolio': scanner_pribadi.scan_local_portfolio}
+    results, failures = [], []
+    for size in args.sizes:
+        panel = expand_panel(base, size, seed=args.seed)
+        tickers = list(panel['Close'].columns)
+        panel_path = os.path.join(workdir, f"panel-{size}.pkl")
+        panel.to_pickle(panel_path)
+
+        for workers in args.workers:
+            fake_yf = FakeYFinance(panel, args.yf_latency, args.yf_per_ticker)
+            ohlcv_cache.yf = fake_yf
+            # Cache kosong per ukuran universe & jumlah worker: run pertama = cold, run kedua = warm
+            cache_dir = os.path.join(workdir, f"cache-{size}-w{workers}")
+            ohlcv_cache.CACHE_DIR = cache_dir
+            sharding.SCAN_WORKERS = workers
+            sharding.WORKER_INITIALIZER = install_worker_fakes
+            sharding.WORKER_INITARGS = (panel_path, args.yf_latency, args.yf_per_ticker, cache_dir)
+
+            for run_kind in ('cold', 'warm')[:args.runs]:
+                for name in args.scanners:
+                    before = (models.calls, models.throttled, TelegramSink.messages)
+                    output = io.StringIO()
+                    with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+                        summary = scans[name](tickers) or {}
+                    after = (models.calls, models.throttled, TelegramSink.messages)
+                    calls, throttled, messages = (b - a for a, b in zip(before, after))
+                    counters = summary.get('counters', {})
+                    # Dari counter run (ikut dijumlah dari worker shard), bukan dari fake_yf proses ini
+                    yf_calls = sum(v for k, v in counters.items() if k.startswith('yf_requests_total'))
+
+                    result = {
+                        'size': size, 'workers': workers, 'scanner': name, 'run': run_kind,
+                        'duration': round(summary.get('duration', 0.0), 4),
+                        'stages': {k: round(v, 4) for k, v in summary.get('stages', {}).items()},
+                        'counters': dict(counters, llm_calls=calls, llm_429=throttled,
+                                         telegram_messages=messages, yf_requests=yf_calls),
+                    }
+                    results.append(result)
+                    stages = " ".join(f"{k}={v:.2f}s" for k, v in result['stages'].items())
+                    print(f"⏱️ {size:>5} w{workers:<2} {name:<25} {run_kind:<4} "
+                          f"total={result['duration']:.2f}s {stages}")
+                    if result['counters'].get('fetch_errors', 0) >= len(tickers):
+                        # Semua ticker gagal diambil: biasanya argumen yfinance yang salah, bukan soal speed
+                        failures.append(f"{size} w{workers} {name} {run_kind}: semua {len(tickers)} ticker gagal diambil")
+                        print(f"   ❌ {failures[-1]}")
+            sharding.shutdown_pool()
+
+    sink.shutdown()
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'fixtures': source,
+            'fixture_days': int(len(base)),
+            'config': {k: getattr(args, k) for k in ('sizes', 'workers', 'runs', 'llm_latency', 'llm_jitter', 'llm_429_rate',
+                                                      'llm_rpm', 'yf_latency', 'yf_per_ticker', 'sink_latency', 'seed')},
+        },
+        'results': results,
+        'failures': failures,
+    }
+
+
+# --- 5. BANDINGKAN DENGAN BASELINE ---
+def compare(current, baseline, threshold=0.2, min_delta=0.05):
+    """
+    Bandingkan waktu total & per tahap dengan hasil sebelumnya.
+    Regresi = lebih lambat dari threshold (relatif) DAN lebih dari min_delta detik.
+    """
+    old = {(r['size'], r.get('workers', 1), r['scanner'], r['run']): r for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        prev = old.get((r['size'], r['workers'], r['scanner'], r['run']))
+        if prev is None:
+            continue
+        pairs = [('total', prev['duration'], r['duration'])]
+        pairs += [(stage, prev['stages'].get(stage), value) for stage, value in r['stages'].items()]
+        for stage, before, after in pairs:
+            if before is None:
+                continue
+            if after - before > min_delta and after > before * (1 + threshold):
+                regressions.append({'size': r['size'], 'workers': r['workers'], 'scanner': r['scanner'],
+                                    'run': r['run'], 'stage': stage, 'baseline': before, 'current': after,
+                                    'change_pct': round((after / before - 1) * 100, 1) if before else None})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline scanner StockVision")
+    parser.add_argument("--record", metavar="PATH", help="Rekam fixture OHLCV asli (butuh internet) lalu keluar")
+    parser.add_argument("--fixtures", metavar="PATH", help="Fixture OHLCV (csv / csv.gz); default data sintetis")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Ukuran universe (default {DEFAULT_SIZES})")
+    parser.add_argument("--scanners", default="scan_top_gainers,scan_top_gainers_intraday,scan_local_portfolio")
+    parser.add_argument("--workers", default=f"1,{max(2, os.cpu_count() or 1)}",
+                        help="Jumlah proses shard (SCAN_WORKERS) yang diukur, default 1 dan jumlah CPU")
+    parser.add_argument("--runs", type=int, choices=(1, 2), default=2, help="1 = cold saja, 2 = cold + warm")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Latency model palsu (detik)")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-429-rate", type=float, default=0.05, help="Peluang jawaban 429 (0-1)")
+    parser.add_argument("--llm-rpm", type=int, default=600, help="AI_MAX_RPM selama benchmark")
+    parser.add_argument("--yf-latency", type=float, default=0.2, help="Latency per request yfinance palsu")
+    parser.add_argument("--yf-per-ticker", type=float, default=0.002, help="Tambahan latency per ticker")
+    parser.add_argument("--sink-latency", type=float, default=0.05, help="Latency sink Telegram")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="benchmark.json", help="File hasil JSON")
+    parser.add_argument("--baseline", help="Hasil JSON sebelumnya untuk cek regresi")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Batas regresi relatif (default 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="Tampilkan output scanner")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.record)
+        sys.exit(0)
+
+    args.sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    args.workers = [int(w) for w in args.workers.split(",") if w.strip()]
+    args.scanners = [s.strip() for s in args.scanners.split(",") if s.strip()]
+    report = run_benchmark(args)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare(report, baseline, threshold=args.threshold)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Hasil -> {args.out}")
+    if report['failures']:
+        sys.exit(1)
+
+    if args.baseline:
+        for reg in report['regressions']:
+            print(f"   🐢 REGRESI {reg['size']} w{reg['workers']} {reg['scanner']} {reg['run']} {reg['stage']}: "
+                  f"{reg['baseline']:.3f}s -> {reg['current']:.3f}s")
+        if report['regressions']:
+            sys.exit(1)
+        print("   ✅ Tidak ada regresi dibanding baseline.")
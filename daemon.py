@@ -0,0 +1,161 @@
+import argparse
+import datetime
+import os
+import signal
+import threading
+import traceback
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+# --- MODE DAEMON: SATU PROSES HIDUP TERUS ---
+# Pengganti cron dingin (auto_scanner.yml tiap 15 menit, private_scanner.yml harian).
+# Import pandas / yfinance / google-genai, client Gemini, pool DB, session Telegram
+# dan cache hanya dibuat sekali lalu dipakai ulang di setiap run.
+# Jalankan: python daemon.py   (atau: python daemon.py --run-now)
+
+load_dotenv()
+WIB = ZoneInfo("Asia/Jakarta")
+
+GAINERS_INTERVAL_MINUTES = int(os.getenv("GAINERS_INTERVAL_MINUTES", "15"))
+# Jam bursa IDX (WIB). Slot terakhir sedikit lewat penutupan supaya harga close ikut terbaca.
+GAINERS_SESSION_START = os.getenv("GAINERS_SESSION_START", "09:00")
+GAINERS_SESSION_END = os.getenv("GAINERS_SESSION_END", "16:15")
+PORTFOLIO_RUN_AT = os.getenv("PORTFOLIO_RUN_AT", "16:30")
+# Jam arsip sinyal lama (retention.py), tiap hari; kosong = tidak dijalankan
+RETENTION_RUN_AT = os.getenv("RETENTION_RUN_AT", "")
+DAEMON_SHUTDOWN_GRACE = float(os.getenv("DAEMON_SHUTDOWN_GRACE", "120"))
+# Tanggal libur bursa, format: 2026-12-25,2026-12-26
+IDX_HOLIDAYS = {d.strip() for d in os.getenv("IDX_HOLIDAYS", "").split(",") if d.strip()}
+
+
+def _clock(value):
+    hour, minute = value.split(":")
+    return datetime.time(int(hour), int(minute))
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day.isoformat() not in IDX_HOLIDAYS
+
+
+def _next_trading_day(day):
+    day += datetime.timedelta(days=1)
+    while not is_trading_day(day):
+        day += datetime.timedelta(days=1)
+    return day
+
+
+def next_gainers_run(now):
+    """Slot berikutnya yang sejajar dengan jam (09:00, 09:15, ...) di dalam jam bursa."""
+    start, end = _clock(GAINERS_SESSION_START), _clock(GAINERS_SESSION_END)
+    day = now.date()
+    if is_trading_day(day):
+        session_start = datetime.datetime.combine(day, start, WIB)
+        session_end = datetime.datetime.combine(day, end, WIB)
+        if now < session_start:
+            return session_start
+        step = datetime.timedelta(minutes=GAINERS_INTERVAL_MINUTES)
+        slot = session_start + ((now - session_start) // step + 1) * step
+        if slot <= session_end:
+            return slot
+    return datetime.datetime.combine(_next_trading_day(day), start, WIB)
+
+
+def next_portfolio_run(now):
+    run_at = _clock(PORTFOLIO_RUN_AT)
+    day = now.date()
+    candidate = datetime.datetime.combine(day, run_at, WIB)
+    if is_trading_day(day) and candidate > now:
+        return candidate
+    return datetime.datetime.combine(_next_trading_day(day), run_at, WIB)
+
+
+def next_retention_run(now):
+    candidate = datetime.datetime.combine(now.date(), _clock(RETENTION_RUN_AT), WIB)
+    return candidate if candidate > now else candidate + datetime.timedelta(days=1)
+
+
+class Job:
+    """Satu jenis scan. Lock memastikan tidak ada dua scan jenis yang sama berjalan bersamaan."""
+
+    def __init__(self, name, func, next_run_fn):
+        self.name = name
+        self.func = func
+        self.next_run_fn = next_run_fn
+        self.lock = threading.Lock()
+        self.next_run = None
+        self.thread = None
+
+    def schedule(self, now):
+        self.next_run = self.next_run_fn(now)
+        print(f"🗓️ {self.name}: run berikutnya {self.next_run:%Y-%m-%d %H:%M} WIB")
+
+    def trigger(self):
+        if not self.lock.acquire(blocking=False):
+            print(f"⏭️ {self.name} masih berjalan, slot ini dilewati.")
+            return
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        started = datetime.datetime.now(WIB)
+        print(f"\n▶️ {self.name} mulai {started:%H:%M:%S} WIB")
+        try:
+            self.func()
+        except Exception:
+            print(f"❌ {self.name} gagal:\n{traceback.format_exc()}")
+        finally:
+            elapsed = (datetime.datetime.now(WIB) - started).total_seconds()
+            print(f"⏹️ {self.name} selesai dalam {elapsed:.0f} detik")
+            self.lock.release()
+
+
+def build_jobs():
+    # Import di sini (sekali) supaya semua state modul tetap hangat antar run
+    import scanner
+    import scanner_pribadi
+
+    jobs = [
+        Job("scan_top_gainers", scanner.scan_top_gainers, next_gainers_run),
+        Job("scan_local_portfolio", scanner_pribadi.scan_local_portfolio, next_portfolio_run),
+    ]
+    if RETENTION_RUN_AT:
+        import retention
+        jobs.append(Job("archive_old_signals", retention.run_retention, next_retention_run))
+    return jobs
+
+
+def run_forever(jobs, run_now=False):
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    now = datetime.datetime.now(WIB)
+    for job in jobs:
+        if run_now:
+            job.trigger()
+        job.schedule(now)
+
+    while not stop.is_set():
+        now = datetime.datetime.now(WIB)
+        due = min(job.next_run for job in jobs)
+        if due > now:
+            stop.wait(min((due - now).total_seconds(), 60))
+            continue
+        for job in jobs:
+            if job.next_run <= now:
+                job.trigger()
+                job.schedule(now)
+
+    # Beri waktu scan yang sedang jalan untuk selesai (tulis DB / kirim Telegram)
+    for job in jobs:
+        if job.thread is not None and job.thread.is_alive():
+            print(f"⏳ Menunggu {job.name} selesai...")
+            job.thread.join(DAEMON_SHUTDOWN_GRACE)
+    print("👋 Daemon berhenti.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="StockVision scheduler daemon")
+    parser.add_argument("--run-now", action="store_true", help="Jalankan semua scan sekali saat start")
+    args = parser.parse_args()
+    run_forever(build_jobs(), run_now=args.run_now)
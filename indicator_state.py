@@ -0,0 +1,237 @@
+import json
+import math
+import os
+import sqlite3
+from collections import deque
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+import indicators
+import metrics
+import ohlcv_cache
+
+# --- STATE INDIKATOR INCREMENTAL (O(1) PER BAR BARU) ---
+# Per ticker disimpan: buffer window + jumlah berjalan untuk MA20 & rata-rata volume 20,
+# buffer gain / loss 14 bar untuk RSI14 (rata-rata sederhana, sama dengan indicators.rsi)
+# dan close terakhir. Bar baru cukup di-"push" ke state (waktu konstan).
+# State yang disimpan = kondisi SEBELUM bar terakhir, karena candle hari ini masih bisa
+# berubah; bar terakhir selalu diterapkan ulang di memori setiap run.
+# State dibangun ulang dari history kalau belum ada, versi beda, atau tidak cocok lagi
+# dengan data (gap / harga direvisi, misal stock split).
+
+load_dotenv()
+INDICATOR_STATE_ENABLED = os.getenv("INDICATOR_STATE_ENABLED", "1") != "0"
+# Naikkan kalau rumus / panjang window berubah -> semua state dibangun ulang
+STATE_VERSION = 1
+_PARAMS = [STATE_VERSION, indicators.MA_WINDOW, indicators.VOL_WINDOW, indicators.RSI_WINDOW]
+
+NAN = float('nan')
+
+
+class RollingWindow:
+    """Rata-rata window tetap. Ada NaN di dalam window -> NaN (sama dengan pandas rolling)."""
+
+    def __init__(self, size, values=()):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.valid = 0
+        for value in values:
+            self.push(value)
+
+    def push(self, value):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            if math.isfinite(old):
+                self.total -= old
+                self.valid -= 1
+        self.values.append(value)
+        if math.isfinite(value):
+            self.total += value
+            self.valid += 1
+        if self.valid == 0:
+            self.total = 0.0  # buang sisa pembulatan
+
+    def mean(self):
+        return self.total / self.size if self.valid == self.size else NAN
+
+
+class TickerState:
+    def __init__(self, ts=None, prev_close=NAN, close=(), volume=(), gain=(), loss=()):
+        self.ts = ts                  # timestamp bar terakhir yang sudah diterapkan
+        self.prev_close = prev_close
+        self.close = RollingWindow(indicators.MA_WINDOW, close)
+        self.volume = RollingWindow(indicators.VOL_WINDOW, volume)
+        self.gain = RollingWindow(indicators.RSI_WINDOW, gain)
+        self.loss = RollingWindow(indicators.RSI_WINDOW, loss)
+
+    def push(self, ts, close, volume):
+        delta = close - self.prev_close
+        finite = math.isfinite(delta)
+        self.gain.push(max(delta, 0.0) if finite else NAN)
+        self.loss.push(max(-delta, 0.0) if finite else NAN)
+        self.close.push(close)
+        self.volume.push(volume)
+        self.prev_close = close
+        self.ts = ts
+
+    def values(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = np.float64(self.gain.mean()) / np.float64(self.loss.mean())
+            rsi = 100 - (100 / (1 + rs))
+        return self.close.mean(), float(rsi), self.volume.mean()
+
+    def to_dict(self):
+        return {
+            'ts': self.ts, 'prev_close': self.prev_close,
+            'close': list(self.close.values), 'volume': list(self.volume.values),
+            'gain': list(self.gain.values), 'loss': list(self.loss.values),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def _connect():
+    os.makedirs(ohlcv_cache.CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(ohlcv_cache.CACHE_DIR, "indicator_state.sqlite"), timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS indicator_state (
+            ticker TEXT PRIMARY KEY,
+            params TEXT NOT NULL,
+            state TEXT NOT NULL
+        )
+    """)
+    return conn
+
+
+def load_states(tickers):
+    params = json.dumps(_PARAMS)
+    states = {}
+    conn = _connect()
+    try:
+        for chunk in ohlcv_cache._chunks(list(tickers), ohlcv_cache._SQL_CHUNK):
+            marks = ",".join("?" * len(chunk))
+            for ticker, row_params, state in conn.execute(
+                    f"SELECT ticker, params, state FROM indicator_state WHERE ticker IN ({marks})", chunk):
+                if row_params != params:
+                    continue
+                try:
+                    states[ticker] = TickerState.from_dict(json.loads(state))
+                except (ValueError, TypeError):
+                    pass  # state rusak -> dibangun ulang
+    finally:
+        conn.close()
+    return states
+
+
+def save_states(states):
+    if not states:
+        return
+    params = json.dumps(_PARAMS)
+    conn = _connect()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO indicator_state (ticker, params, state) VALUES (?, ?, ?)",
+                [(ticker, params, json.dumps(state.to_dict())) for ticker, state in states.items()])
+    finally:
+        conn.close()
+
+
+def _resume_at(state, stamps, close, last):
+    """
+    Index bar pertama yang belum diterapkan ke state, atau None kalau state harus dibangun ulang:
+    timestamp state tidak ada di history ticker itu, atau close di timestamp itu sudah berbeda.
+    """
+    if state is None or state.ts is None:
+        return None
+    pos = int(np.searchsorted(stamps, state.ts))
+    if pos >= last or stamps[pos] != state.ts:
+        return None
+    stored, current = state.prev_close, close[pos]
+    if math.isnan(stored) != math.isnan(current):
+        return None
+    if not math.isnan(stored) and not math.isclose(stored, current, rel_tol=1e-9, abs_tol=1e-9):
+        return None
+    return pos + 1
+
+
+def build_indicator_table(history):
+    """
+    Pengganti indicators.build_indicator_table (format tabel sama) yang memakai state
+    tersimpan: hanya bar setelah state terakhir yang dihitung.
+    """
+    close_frame = history['Close']
+    tickers = close_frame.columns
+    if len(history) == 0:
+        return indicators.build_indicator_table(history)
+
+    arrays = [history[field].reindex(columns=tickers).to_numpy(dtype=float)
+              for field in ('Open', 'High', 'Low', 'Close', 'Volume')]
+    # Sama dengan indicators: tiap ticker hanya memakai bar miliknya sendiri
+    order, filled, arrays = indicators.align_last_bars(np.isfinite(arrays[3]), *arrays)
+    open_, high, low, close, volume = arrays
+    stamps = np.array([ts.strftime(ohlcv_cache.TS_FORMAT) for ts in history.index])
+    bars = filled.sum(axis=0)
+    rows = len(close)
+
+    states = load_states(tickers)
+    changed = {}
+    counts = {'reused': 0, 'updated': 0, 'rebuilt': 0}
+    values = np.full((len(tickers), 3), np.nan)
+
+    for j, ticker in enumerate(tickers):
+        if bars[j] == 0:
+            continue
+        first = rows - bars[j]
+        col_stamps = stamps[order[first:, j]]
+        col_close, col_volume = close[first:, j], volume[first:, j]
+        last = len(col_stamps) - 1
+
+        state = states.get(ticker)
+        start = _resume_at(state, col_stamps, col_close, last)
+        if start is None:
+            state, start = TickerState(), 0
+            counts['rebuilt'] += 1
+        else:
+            counts['updated' if start < last else 'reused'] += 1
+
+        # Semua bar kecuali yang terakhir -> masuk state tersimpan
+        for i in range(start, last):
+            state.push(col_stamps[i], col_close[i], col_volume[i])
+        if start < last:
+            changed[ticker] = state
+
+        # Bar terakhir (candle hari ini) diterapkan pada salinan, tidak disimpan
+        live = TickerState.from_dict(state.to_dict())
+        live.push(col_stamps[last], col_close[last], col_volume[last])
+        values[j] = live.values()
+
+    save_states(changed)
+    for status, count in counts.items():
+        metrics.inc('indicator_state_tickers_total', count, status=status)
+
+    ma20, rsi_now, vol_avg = values[:, 0], values[:, 1], values[:, 2]
+    candle_range = high[-1] - low[-1]
+    candle_range = np.where(candle_range == 0, 1, candle_range)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prev_close = close[-2] if len(close) > 1 else np.full(close.shape[1], np.nan)
+        table = pd.DataFrame({
+            'price': close[-1],
+            'change_pct': (close[-1] - prev_close) / prev_close * 100,
+            'ma20': ma20,
+            'rsi': rsi_now,
+            'vol_avg': vol_avg,
+            'vol_ratio': volume[-1] / vol_avg,
+            'shadow_ratio': (high[-1] - np.maximum(close[-1], open_[-1])) / candle_range,
+            'bars': bars,
+        }, index=tickers)
+    table.index.name = 'ticker'
+
+    table = table[np.isfinite(table['price']) & (table['bars'] >= indicators.MIN_BARS)].copy()
+    table['vol_status'] = indicators.volume_label(table['vol_ratio'])
+    table['ob_note'] = indicators.shadow_label(table['shadow_ratio'])
+    return table
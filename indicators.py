@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+# --- ENGINE INDIKATOR VEKTOR (SEMUA TICKER SEKALIGUS) ---
+# Input: array 2D (tanggal x ticker) yang sudah sejajar.
+# Semua rumus sama persis dengan versi pandas per-ticker di scanner_pribadi.py:
+#   MA20  = Close.rolling(20).mean()
+#   RSI14 = rata-rata gain / loss (rolling 14, simple mean)
+#   Volume ratio = Volume hari ini / rata-rata Volume 20 bar terakhir
+#   Shadow ratio = ekor atas / range candle terakhir
+#   Change %     = close terakhir vs close bar sebelumnya
+
+MA_WINDOW = 20
+RSI_WINDOW = 14
+VOL_WINDOW = 20
+MIN_BARS = 50
+
+HIGH_VOLUME = "🔥 High Volume (Akumulasi)"
+LOW_VOLUME = "❄️ Low Volume (Sepi)"
+NORMAL_VOLUME = "Normal Volume"
+SHADOW_WARNING = "⚠️ Awas Guyuran (Ekor Atas Panjang)"
+SHADOW_OK = "✅ Selling Pressure Rendah"
+
+
+def rolling_mean(values, window):
+    """
+    Rolling mean sepanjang axis 0 (sama dengan pandas rolling(window).mean()).
+    Hasil NaN kalau ada NaN di dalam window atau bar belum cukup.
+    """
+    values = np.asarray(values, dtype=float)
+    valid = np.isfinite(values)
+    zeros = np.zeros((1,) + values.shape[1:])
+
+    csum = np.concatenate([zeros, np.cumsum(np.where(valid, values, 0.0), axis=0)])
+    ccount = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        total = csum[window:] - csum[:-window]
+        count = ccount[window:] - ccount[:-window]
+        out[window - 1:] = np.where(count == window, total / window, np.nan)
+    return out
+
+
+def rsi(close, window=RSI_WINDOW):
+    close = np.asarray(close, dtype=float)
+    delta = np.full(close.shape, np.nan)
+    delta[1:] = close[1:] - close[:-1]
+
+    gain = rolling_mean(np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None)), window)
+    loss = rolling_mean(np.where(np.isnan(delta), np.nan, np.clip(-delta, 0, None)), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = gain / loss
+        return 100 - (100 / (1 + rs))
+
+
+def compute_indicators(open_, high, low, close, volume):
+    """
+    Hitung semua indikator untuk semua ticker dalam satu pass NumPy.
+    Return dict array 2D (tanggal x ticker).
+    """
+    open_, high, low, close, volume = (np.asarray(a, dtype=float) for a in (open_, high, low, close, volume))
+
+    vol_avg = rolling_mean(volume, VOL_WINDOW)
+    candle_range = high - low
+    candle_range = np.where(candle_range == 0, 1, candle_range)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'ma20': rolling_mean(close, MA_WINDOW),
+            'rsi': rsi(close),
+            'vol_avg': vol_avg,
+            'vol_ratio': volume / vol_avg,
+            'shadow_ratio': (high - np.maximum(close, open_)) / candle_range,
+        }
+
+
+def volume_label(vol_ratio):
+    vol_ratio = np.asarray(vol_ratio, dtype=float)
+    return np.select([vol_ratio > 1.2, vol_ratio < 0.8], [HIGH_VOLUME, LOW_VOLUME], NORMAL_VOLUME)
+
+
+def shadow_label(shadow_ratio):
+    return np.where(np.asarray(shadow_ratio, dtype=float) > 0.4, SHADOW_WARNING, SHADOW_OK)
+
+
+def align_last_bars(valid, *arrays):
+    """
+    Geser bar valid tiap ticker ke bawah (urutan waktu tetap), sisa atasnya NaN.
+    Baris terakhir jadi bar terakhir MASING-MASING ticker, sama seperti data per ticker di
+    kode lama: ticker yang tidak punya bar di tanggal tertentu (suspend / belum update)
+    tidak membuat window rolling-nya ikut NaN.
+    Return: (order, filled, arrays) -> order[i, j] = baris asli, filled = mask bar valid.
+    """
+    order = np.argsort(valid, axis=0, kind='stable')
+    filled = np.take_along_axis(valid, order, axis=0)
+    return order, filled, [np.where(filled, np.take_along_axis(a, order, axis=0), np.nan) for a in arrays]
+
+
+def build_indicator_table(history):
+    """
+    history: frame kolom MultiIndex (field, ticker) dari ohlcv_cache.get_history.
+    Return tabel kandidat ringkas (1 baris per ticker) berisi nilai bar terakhir ticker itu.
+    Ticker dengan data < MIN_BARS di-drop.
+    """
+    close = history['Close']
+    tickers = close.columns
+    if len(history) == 0:
+        return pd.DataFrame(columns=['price', 'change_pct', 'ma20', 'rsi', 'vol_avg', 'vol_ratio',
+                                     'shadow_ratio', 'bars', 'vol_status', 'ob_note'])
+    arrays = [history[field].reindex(columns=tickers).to_numpy(dtype=float)
+              for field in ('Open', 'High', 'Low', 'Close', 'Volume')]
+    # Tiap ticker dihitung dari bar miliknya sendiri (baris terakhir = bar terakhir ticker itu)
+    _, _, arrays = align_last_bars(np.isfinite(arrays[3]), *arrays)
+
+    ind = compute_indicators(*arrays)
+    close_arr = arrays[3]
+    prev_close = close_arr[-2] if len(close_arr) > 1 else np.full(close_arr.shape[1], np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_pct = (close_arr[-1] - prev_close) / prev_close * 100
+    table = pd.DataFrame({
+        'price': close_arr[-1],
+        'change_pct': change_pct,
+        'ma20': ind['ma20'][-1],
+        'rsi': ind['rsi'][-1],
+        'vol_avg': ind['vol_avg'][-1],
+        'vol_ratio': ind['vol_ratio'][-1],
+        'shadow_ratio': ind['shadow_ratio'][-1],
+        'bars': np.isfinite(close_arr).sum(axis=0),
+    }, index=tickers)
+    table.index.name = 'ticker'
+
+    table = table[np.isfinite(table['price']) & (table['bars'] >= MIN_BARS)].copy()
+    table['vol_status'] = volume_label(table['vol_ratio'])
+    table['ob_note'] = shadow_label(table['shadow_ratio'])
+    return table
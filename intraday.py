@@ -0,0 +1,150 @@
+import datetime
+import heapq
+import json
+import math
+import os
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+import ohlcv_cache
+
+# --- MODE INTRADAY: TRACKING TOP GAINERS SECARA INCREMENTAL ---
+# Harga penutupan kemarin (prev close) diambil SEKALI per sesi bursa.
+# Setiap run cukup ambil bar intraday terbaru (1m/5m, lewat ohlcv_cache jadi yang
+# di-download hanya bar baru), update change_pct per ticker, dan ranking dijaga
+# dengan heap sehingga tidak perlu sort ulang seluruh universe.
+
+load_dotenv()
+INTRADAY_INTERVAL = os.getenv("INTRADAY_INTERVAL", "5m")
+WIB = ZoneInfo("Asia/Jakarta")
+
+
+class GainerTracker:
+    def __init__(self, session, prev_close, prices=None):
+        self.session = session          # tanggal sesi (YYYY-MM-DD)
+        self.prev_close = prev_close    # ticker -> close kemarin
+        self.prices = {}                # ticker -> harga terakhir
+        self.changes = {}               # ticker -> change_pct terakhir
+        self._version = {}
+        self._heap = []                 # (-change_pct, ticker, versi); entri lama dibuang malas
+        for ticker, price in (prices or {}).items():
+            self.update(ticker, price)
+
+    def update(self, ticker, price):
+        """Update harga satu ticker. Return True kalau ranking berubah."""
+        prev = self.prev_close.get(ticker)
+        if not prev or price is None or math.isnan(price) or self.prices.get(ticker) == price:
+            return False
+
+        change = (price - prev) / prev * 100
+        version = self._version.get(ticker, 0) + 1
+        self.prices[ticker] = price
+        self.changes[ticker] = change
+        self._version[ticker] = version
+        heapq.heappush(self._heap, (-change, ticker, version))
+
+        # Buang entri basi kalau heap sudah jauh lebih besar dari jumlah ticker
+        if len(self._heap) > 4 * len(self._version) + 64:
+            self._heap = [(-self.changes[t], t, v) for t, v in self._version.items()]
+            heapq.heapify(self._heap)
+        return True
+
+    def top(self, n, min_change=0.0):
+        """n gainer teratas dengan change_pct > min_change, tanpa sort ulang semua ticker."""
+        result, kept = [], []
+        while self._heap and len(result) < n:
+            entry = heapq.heappop(self._heap)
+            neg_change, ticker, version = entry
+            if self._version.get(ticker) != version:
+                continue  # entri basi, harga ticker ini sudah diupdate
+            kept.append(entry)
+            if -neg_change <= min_change:
+                break
+            result.append({'ticker': ticker, 'price': self.prices[ticker], 'change_pct': -neg_change})
+        for entry in kept:
+            heapq.heappush(self._heap, entry)
+        return result
+
+    def to_state(self):
+        return {'session': self.session, 'prev_close': self.prev_close, 'prices': self.prices}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state['session'], state['prev_close'], state.get('prices'))
+
+
+def _state_path():
+    return os.path.join(ohlcv_cache.CACHE_DIR, "gainer_tracker.json")
+
+
+def _load_prev_close(tickers, session):
+    """Close terakhir SEBELUM sesi hari ini, sekali per sesi."""
+    history, errors = ohlcv_cache.get_history(tickers, period='10d', interval='1d')
+    close = history['Close']
+    close = close[close.index < session]
+    if close.empty:
+        return {}, errors
+    prev_close = close.ffill().iloc[-1].dropna()
+    return {t: float(v) for t, v in prev_close.items() if v > 0}, errors
+
+
+# Tracker disimpan di memori (mode daemon) dan di disk (mode cron)
+_tracker = None
+
+
+def get_tracker(tickers, session=None):
+    global _tracker
+    session = session or datetime.datetime.now(WIB).date().isoformat()
+    if _tracker is not None and _tracker.session == session:
+        return _tracker, {}
+
+    errors = {}
+    tracker = None
+    try:
+        with open(_state_path()) as f:
+            state = json.load(f)
+        if state.get('session') == session:
+            tracker = GainerTracker.from_state(state)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    missing = [t for t in tickers if tracker is None or t not in tracker.prev_close]
+    if missing:
+        prev_close, errors = _load_prev_close(missing, session)
+        if tracker is None:
+            tracker = GainerTracker(session, prev_close)
+        else:
+            tracker.prev_close.update(prev_close)
+
+    _tracker = tracker
+    return tracker, errors
+
+
+def save_tracker(tracker):
+    os.makedirs(ohlcv_cache.CACHE_DIR, exist_ok=True)
+    path = _state_path()
+    with open(path + ".tmp", "w") as f:
+        json.dump(tracker.to_state(), f)
+    os.replace(path + ".tmp", path)
+
+
+def scan_intraday(tickers, top_n=15, interval=INTRADAY_INTERVAL):
+    """
+    Ambil bar intraday terbaru, update tracker, kembalikan (top gainers, error per ticker).
+    Format top gainers sama dengan mode harian: list dict ticker / price / change_pct.
+    """
+    tracker, errors = get_tracker(tickers)
+
+    history, fetch_errors = ohlcv_cache.get_history(tickers, period='1d', interval=interval)
+    errors.update(fetch_errors)
+
+    close = history['Close']
+    close = close[close.index >= tracker.session]
+    changed = 0
+    if len(close):
+        latest = close.ffill().iloc[-1]
+        for ticker, price in latest.dropna().items():
+            changed += tracker.update(ticker, float(price))
+
+    save_tracker(tracker)
+    print(f"   [INTRADAY] {changed} ticker berubah harga ({interval}), sesi {tracker.session}")
+    return tracker.top(top_n), errors
@@ -1,24 +1,90 @@
-from fastapi import FastAPI, HTTPException
-from sqlalchemy import create_engine, text
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from contextlib import asynccontextmanager
 import os
+import json
+import time
+import base64
+import hashlib
+import asyncio
+import datetime
+import functools
+import re
+from collections import OrderedDict
+from email.utils import format_datetime, parsedate_to_datetime
 from dotenv import load_dotenv
 import pandas as pd
+import signals_db
+import run_history
+import metrics
+import universe
 
 # Load env jika di laptop (di Render ini otomatis dilewati)
 load_dotenv()
 
-app = FastAPI()
-
-# 1. KONEKSI DATABASE
+# 1. KONEKSI DATABASE (ASYNC + POOL)
 DB_URL = os.getenv("DB_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+HISTORY_DEFAULT_LIMIT = int(os.getenv("HISTORY_DEFAULT_LIMIT", "50"))
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "500"))
+SIGNALS_STREAM_POLL_SECONDS = float(os.getenv("SIGNALS_STREAM_POLL_SECONDS", "5"))
+SIGNALS_STREAM_HEARTBEAT_SECONDS = float(os.getenv("SIGNALS_STREAM_HEARTBEAT_SECONDS", "15"))
+SIGNALS_STREAM_QUEUE_SIZE = int(os.getenv("SIGNALS_STREAM_QUEUE_SIZE", "100"))
+SIGNALS_STREAM_REPLAY_LIMIT = int(os.getenv("SIGNALS_STREAM_REPLAY_LIMIT", "500"))
+ANALYZE_CACHE_TTL_SECONDS = float(os.getenv("ANALYZE_CACHE_TTL_SECONDS", "300"))
+ANALYZE_CACHE_SIZE = int(os.getenv("ANALYZE_CACHE_SIZE", "256"))
+
+# Index untuk query terbaru (/api/signals) dan filter per ticker
+INDEX_DDL = [
+    # Keyset pagination /api/signals/history: urutan (created_at, id) harus ada di index.
+    # Dua index ini juga melayani query lama per created_at / (ticker, created_at)
+    "CREATE INDEX IF NOT EXISTS idx_detected_patterns_created_at_id ON detected_patterns (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_detected_patterns_ticker_created_at_id ON detected_patterns (ticker, created_at DESC, id DESC)",
+    # Index versi sebelumnya: tercakup index di atas, hanya memperlambat INSERT
+    "DROP INDEX IF EXISTS idx_detected_patterns_created_at",
+    "DROP INDEX IF EXISTS idx_detected_patterns_ticker_created_at",
+]
+
+def async_db_url(url):
+    """
+    Ubah URL sync (postgresql://, sqlite://) ke driver async.
+    asyncpg tidak kenal ?sslmode=..., jadi dipindah ke connect_args['ssl'].
+    """
+    parsed = make_url(signals_db.sync_db_url(url))
+    connect_args = {}
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        sslmode = parsed.query.get("sslmode")
+        parsed = parsed.set(drivername="postgresql+asyncpg").difference_update_query(["sslmode"])
+        if sslmode:
+            connect_args["ssl"] = sslmode
+    elif backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed, connect_args
+
+def build_engine(url):
+    parsed, connect_args = async_db_url(url)
+    options = {"connect_args": connect_args, "pool_pre_ping": DB_POOL_PRE_PING}
+    if parsed.get_backend_name() != "sqlite":
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return create_async_engine(parsed, **options)
 
 try:
     if DB_URL:
-        # Ganti 'postgres://' jadi 'postgresql://' jika perlu
-        if DB_URL.startswith("postgres://"):
-            DB_URL = DB_URL.replace("postgres://", "postgresql://", 1)
-        
-        engine = create_engine(DB_URL)
+        engine = build_engine(DB_URL)
         print("✅ Database Connected via Main API")
     else:
         print("⚠️ DB_URL not found!")
@@ -27,37 +93,473 @@ except Exception as e:
     print(f"❌ Connection Failed: {e}")
     engine = None
 
+async def ensure_indexes():
+    """Pastikan tabel & index detected_patterns ada (dijalankan sekali saat startup)."""
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(signals_db.ensure_schema)
+            await conn.run_sync(run_history.ensure_schema)
+            for ddl in INDEX_DDL:
+                await conn.execute(text(ddl))
+        print("✅ Index detected_patterns siap")
+    except Exception as e:
+        print(f"⚠️ Gagal membuat index: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    if engine is not None:
+        await ensure_indexes()
+    yield
+    await signal_watcher.stop()
+    if engine is not None:
+        await engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+metrics.registry.describe("http_request_seconds", "Latency request API per route")
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label pakai template route (/api/signals/history), bukan URL mentah, supaya seri tetap sedikit
+        route = request.scope.get("route")
+        metrics.observe('http_request_seconds', time.perf_counter() - started, method=request.method,
+                        path=getattr(route, "path", "unmatched"), status=status)
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {
         "status": "Server is ON",
         "message": "Welcome to StockVision API. Access /api/signals to see latest Top Gainers."
     }
 
-# 2. ENDPOINT UTAMA: /api/signals (VERSI UPDATE)
+# 2. CACHE RESPONSE /api/signals
+# Data cuma berubah saat scanner menulis (paling cepat 15 menit sekali), jadi JSON-nya
+# disimpan sebagai bytes siap kirim. MAX(created_at) dicek paling sering tiap
+# SIGNALS_CACHE_CHECK_SECONDS; di antara itu cache hit tidak menyentuh DB maupun serializer.
+SIGNALS_CACHE_CHECK_SECONDS = float(os.getenv("SIGNALS_CACHE_CHECK_SECONDS", "15"))
+
+# Dibaca dari latest_signals (1 baris per ticker, di-upsert scanner di transaksi yang sama
+# dengan detected_patterns), jadi ukuran yang dibaca tidak ikut tumbuh seiring waktu
+SIGNALS_QUERY = text("SELECT ticker, pattern_name, price, story, created_at FROM latest_signals ORDER BY created_at DESC, scan_rank LIMIT 15")
+MARKER_QUERY = text("SELECT MAX(created_at) FROM latest_signals")
+
+_signals_cache = None  # dict: marker, body, etag, last_modified, checked_at
+_signals_lock = asyncio.Lock()
+
+def _serialize(data):
+    # Format sama dengan JSONResponse bawaan FastAPI
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+def _http_date(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime.datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return format_datetime(value.astimezone(datetime.timezone.utc), usegmt=True)
+
+async def _load_signals():
+    global _signals_cache
+    cached = _signals_cache
+    if cached is not None and time.monotonic() - cached['checked_at'] < SIGNALS_CACHE_CHECK_SECONDS:
+        return cached
+
+    async with _signals_lock:
+        cached = _signals_cache
+        if cached is not None and time.monotonic() - cached['checked_at'] < SIGNALS_CACHE_CHECK_SECONDS:
+            return cached
+
+        async with engine.connect() as conn:
+            marker = (await conn.execute(MARKER_QUERY)).scalar()
+            if cached is not None and marker == cached['marker']:
+                # Tidak ada tulisan baru: pakai body lama, cukup perbarui waktu cek
+                _signals_cache = {**cached, 'checked_at': time.monotonic()}
+                return _signals_cache
+
+            # PERBAIKAN UTAMA:
+            # 1. ORDER BY created_at DESC -> Mengambil data waktu terbaru
+            # 2. LIMIT 15 -> Hanya menampilkan 15 saham teratas (Top Gainers)
+            result = await conn.execute(SIGNALS_QUERY)
+            # Ubah hasil database menjadi list dictionary (JSON)
+            columns = result.keys()
+            data = [dict(zip(columns, row)) for row in result.fetchall()]
+
+        body = _serialize(data)
+        _signals_cache = {
+            'marker': marker,
+            'body': body,
+            'etag': '"' + hashlib.sha1(body).hexdigest()[:20] + '"',
+            'last_modified': _http_date(marker),
+            'checked_at': time.monotonic(),
+        }
+        return _signals_cache
+
+def _not_modified(request, entry):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or entry['etag'] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and entry['last_modified']:
+        try:
+            return parsedate_to_datetime(entry['last_modified']) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+# 3. ENDPOINT UTAMA: /api/signals (VERSI UPDATE)
 @app.get("/api/signals")
-def get_signals():
+async def get_signals(request: Request):
     if not engine:
         raise HTTPException(status_code=500, detail="Database connection not setup")
     
     try:
-        # PERBAIKAN UTAMA:
-        # 1. ORDER BY created_at DESC -> Mengambil data waktu terbaru
-        # 2. LIMIT 15 -> Hanya menampilkan 15 saham teratas (Top Gainers)
-        query = text("SELECT ticker, pattern_name, price, story, created_at FROM detected_patterns ORDER BY created_at DESC LIMIT 15")
-        
-        with engine.connect() as conn:
-            result = conn.execute(query)
-            # Ubah hasil database menjadi list dictionary (JSON)
+        entry = await _load_signals()
+    except Exception as e:
+        print(f"❌ Query Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {"ETag": entry['etag'], "Cache-Control": "no-cache"}
+    if entry['last_modified']:
+        headers["Last-Modified"] = entry['last_modified']
+
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry['body'], media_type="application/json", headers=headers)
+
+# 4. HISTORY SINYAL: KEYSET PAGINATION (created_at, id)
+# Halaman berikutnya dicari dengan WHERE (created_at, id) < cursor, bukan OFFSET,
+# jadi waktu respon tetap sama sedalam apa pun halamannya.
+def _naive_utc(value):
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+def encode_cursor(created_at, row_id):
+    if isinstance(created_at, datetime.datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([str(created_at), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return _naive_utc(datetime.datetime.fromisoformat(created_at)), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor tidak valid")
+
+@app.get("/api/signals/history")
+async def get_signal_history(
+    ticker: str | None = None,
+    pattern_name: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    limit: int = Query(HISTORY_DEFAULT_LIMIT, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: str | None = None,
+):
+    if not engine:
+        raise HTTPException(status_code=500, detail="Database connection not setup")
+
+    conditions = []
+    params = {"limit": limit + 1}
+    if ticker:
+        conditions.append("ticker = :ticker")
+        params["ticker"] = universe.normalize(ticker)
+    if pattern_name:
+        conditions.append("pattern_name = :pattern_name")
+        params["pattern_name"] = pattern_name
+    if start:
+        conditions.append("created_at >= :start")
+        params["start"] = _naive_utc(start)
+    if end:
+        conditions.append("created_at < :end")
+        params["end"] = _naive_utc(end)
+    if cursor:
+        conditions.append("(created_at, id) < (:cursor_ts, :cursor_id)")
+        params["cursor_ts"], params["cursor_id"] = decode_cursor(cursor)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = text(
+        "SELECT id, ticker, pattern_name, price, story, created_at FROM detected_patterns "
+        f"{where} ORDER BY created_at DESC, id DESC LIMIT :limit"
+    )
+
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(query, params)
             columns = result.keys()
-            data = [dict(zip(columns, row)) for row in result.fetchall()]
-            
-            return data
-            
+            rows = [dict(zip(columns, row)) for row in result.fetchall()]
     except Exception as e:
         print(f"❌ Query Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+    return {"data": rows, "next_cursor": next_cursor, "limit": limit}
+
+# 5. LIVE STREAM SINYAL (SERVER-SENT EVENTS)
+# Satu watcher bersama polling DB tiap SIGNALS_STREAM_POLL_SECONDS (hanya selama ada
+# subscriber) lalu menyebarkan baris baru ke semua koneksi. Jumlah query ke DB tetap
+# 1 per interval, berapa pun jumlah client yang tersambung.
+# Client yang reconnect dengan header Last-Event-ID dapat baris setelah id itu lewat 1 query
+# (maks SIGNALS_STREAM_REPLAY_LIMIT baris, sisanya lewat /api/signals/history), lalu ikut watcher.
+class SignalWatcher:
+    LATEST_QUERY = text("SELECT created_at, id FROM detected_patterns ORDER BY created_at DESC, id DESC LIMIT 1")
+    NEW_ROWS_QUERY = text(
+        "SELECT id, ticker, pattern_name, price, story, created_at FROM detected_patterns "
+        "WHERE (created_at, id) > (:last_ts, :last_id) ORDER BY created_at, id LIMIT 500"
+    )
+    ALL_ROWS_QUERY = text(
+        "SELECT id, ticker, pattern_name, price, story, created_at FROM detected_patterns "
+        "ORDER BY created_at, id LIMIT 500"
+    )
+    REPLAY_QUERY = text(
+        "SELECT id, ticker, pattern_name, price, story, created_at FROM detected_patterns "
+        "WHERE (created_at, id) > (:cursor_ts, :cursor_id) ORDER BY created_at, id LIMIT :limit"
+    )
+
+    def __init__(self):
+        self.subscribers = set()
+        self.task = None
+        self.last_key = None  # (created_at, id) baris terakhir yang sudah disebar
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SIGNALS_STREAM_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    def _broadcast(self, event):
+        for queue in list(self.subscribers):
+            if queue.full():
+                # Client lambat: buang event tertua supaya watcher tidak ikut tertahan
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _poll(self):
+        async with engine.connect() as conn:
+            if self.last_key is None:
+                latest = (await conn.execute(self.LATEST_QUERY)).first()
+                # Hanya baris yang masuk SETELAH watcher hidup yang dikirim
+                # (kecuali stream_signals sudah mengisi last_key dari hasil replay)
+                if self.last_key is None:
+                    self.last_key = (latest[0], latest[1]) if latest else ()
+                return []
+            if self.last_key:
+                result = await conn.execute(self.NEW_ROWS_QUERY,
+                                            {"last_ts": self.last_key[0], "last_id": self.last_key[1]})
+            else:
+                result = await conn.execute(self.ALL_ROWS_QUERY)
+            columns = result.keys()
+            return [dict(zip(columns, row)) for row in result.fetchall()]
+
+    async def _run(self):
+        global _signals_cache
+        try:
+            while self.subscribers:
+                try:
+                    rows = await self._poll()
+                except Exception as e:
+                    print(f"❌ Stream Query Error: {e}")
+                    rows = []
+
+                if rows:
+                    self.last_key = (rows[-1]["created_at"], rows[-1]["id"])
+                    _signals_cache = None  # Ada tulisan baru: cache /api/signals langsung dibangun ulang
+                    for row in rows:
+                        key = (row["created_at"], row["id"])
+                        self._broadcast((key, encode_cursor(*key), _serialize(row)))
+
+                await asyncio.sleep(SIGNALS_STREAM_POLL_SECONDS)
+        finally:
+            # Tidak ada subscriber: watcher berhenti, mulai lagi dari baris terbaru saat ada client baru
+            self.last_key = None
+
+signal_watcher = SignalWatcher()
+
+@app.get("/api/signals/stream")
+async def stream_signals(request: Request):
+    if not engine:
+        raise HTTPException(status_code=500, detail="Database connection not setup")
+
+    last_event_id = request.headers.get("last-event-id")
+    try:
+        since = decode_cursor(last_event_id) if last_event_id else None
+    except HTTPException:
+        since = None  # id rusak: anggap koneksi baru, jangan putus (EventSource berhenti reconnect kalau 4xx)
+
+    # Subscribe dulu baru replay: baris yang masuk selama query replay tetap tertampung di queue
+    queue = signal_watcher.subscribe()
+
+    async def events():
+        try:
+            yield b"retry: 5000\n\n"
+            sent_key = None
+            if since:
+                try:
+                    async with engine.connect() as conn:
+                        result = await conn.execute(SignalWatcher.REPLAY_QUERY, {
+                            "cursor_ts": since[0], "cursor_id": since[1], "limit": SIGNALS_STREAM_REPLAY_LIMIT})
+                        columns = result.keys()
+                        rows = [dict(zip(columns, row)) for row in result.fetchall()]
+                except Exception as e:
+                    print(f"❌ Stream Replay Error: {e}")
+                    rows = []
+                for row in rows:
+                    sent_key = (row["created_at"], row["id"])
+                    yield (b"id: " + encode_cursor(*sent_key).encode("ascii") + b"\nevent: signal\ndata: "
+                           + _serialize(row) + b"\n\n")
+                if signal_watcher.last_key is None and len(rows) < SIGNALS_STREAM_REPLAY_LIMIT:
+                    # Watcher baru belum ambil baris terakhir: lanjutkan dari replay supaya tidak ada yang terlewat
+                    signal_watcher.last_key = sent_key or since
+            while True:
+                try:
+                    key, event_id, payload = await asyncio.wait_for(queue.get(), timeout=SIGNALS_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": ping\n\n"
+                    continue
+                if sent_key and key <= sent_key:
+                    continue  # Sudah terkirim lewat replay
+                yield b"id: " + event_id.encode("ascii") + b"\nevent: signal\ndata: " + payload + b"\n\n"
+        finally:
+            signal_watcher.unsubscribe(queue)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+# 6. METRICS (FORMAT PROMETHEUS)
+# Latency request API dicatat di proses ini; data scanner (tahap, yfinance, Gemini, DB,
+# Telegram) dibaca dari run terakhir per scanner di tabel scan_runs.
+LAST_RUNS_QUERY = text("""
+    SELECT s.scanner, s.status, s.started_at, s.duration, s.stages, s.counters
+    FROM scan_runs s JOIN (SELECT scanner, MAX(id) AS id FROM scan_runs GROUP BY scanner) last ON s.id = last.id
+""")
+RUN_COUNTS_QUERY = text("SELECT scanner, status, COUNT(*) FROM scan_runs GROUP BY scanner, status")
+
+async def _scan_run_metrics():
+    snapshot = metrics.Registry()
+    async with engine.connect() as conn:
+        last_runs = (await conn.execute(LAST_RUNS_QUERY)).fetchall()
+        run_counts = (await conn.execute(RUN_COUNTS_QUERY)).fetchall()
+
+    for scanner, status, started_at, duration, stages, counters in last_runs:
+        if isinstance(started_at, str):
+            started_at = datetime.datetime.fromisoformat(started_at)
+        snapshot.set("scan_last_started_timestamp_seconds", started_at.timestamp(), scanner=scanner)
+        snapshot.set("scan_last_duration_seconds", duration, scanner=scanner)
+        snapshot.set("scan_last_status", 1, scanner=scanner, status=status)
+        for stage, seconds in json.loads(stages or "{}").items():
+            snapshot.set("scan_last_stage_seconds", seconds, scanner=scanner, stage=stage)
+        for counter, value in json.loads(counters or "{}").items():
+            snapshot.set("scan_last_counter", value, scanner=scanner, counter=counter)
+    for scanner, status, count in run_counts:
+        snapshot.set("scan_history_runs", count, scanner=scanner, status=status)
+    return snapshot.render()
+
+@app.get("/metrics")
+async def get_metrics():
+    body = metrics.registry.render()
+    if engine is not None:
+        try:
+            body += await _scan_run_metrics()
+        except Exception as e:
+            print(f"⚠️ Gagal baca scan_runs: {e}")
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# 7. ANALISA ON-DEMAND SATU TICKER
+# Rumus & prompt sama dengan scan_local_portfolio. Request bersamaan untuk ticker yang sama
+# digabung (single-flight): hanya 1 download yfinance + 1 panggilan Gemini yang berjalan,
+# request lain menunggu hasil yang sama. Hasil disimpan di LRU kecil selama
+# ANALYZE_CACHE_TTL_SECONDS. Error dan rencana AI yang gagal tidak di-cache.
+TICKER_PATTERN = re.compile(r"^[A-Z0-9\-]{1,12}\.[A-Z]{1,3}$")
+
+_analyze_cache = OrderedDict()  # ticker -> (kedaluwarsa monotonic, hasil)
+_analyze_inflight = {}          # ticker -> Future analisa yang sedang berjalan
+
+def _run_analysis(ticker):
+    # Import di sini: scanner_pribadi membuat client Gemini & session Telegram,
+    # API yang tidak pernah dipanggil /api/analyze tidak perlu ikut memuatnya
+    import scanner_pribadi
+    return scanner_pribadi.analyze_ticker(ticker)
+
+def _analysis_done(ticker, future):
+    import scanner_pribadi
+    _analyze_inflight.pop(ticker, None)
+    if future.cancelled() or future.exception() is not None:
+        return
+    # Rencana AI gagal (Gemini error / kuota) -> jangan di-cache, request berikutnya coba lagi
+    if future.result()['plan'] == scanner_pribadi.PLAN_UNAVAILABLE:
+        return
+    _analyze_cache[ticker] = (time.monotonic() + ANALYZE_CACHE_TTL_SECONDS, future.result())
+    _analyze_cache.move_to_end(ticker)
+    while len(_analyze_cache) > ANALYZE_CACHE_SIZE:
+        _analyze_cache.popitem(last=False)
+
+async def analyze(ticker):
+    entry = _analyze_cache.get(ticker)
+    if entry is not None and entry[0] > time.monotonic():
+        _analyze_cache.move_to_end(ticker)
+        metrics.inc('analyze_requests_total', source='cache')
+        return entry[1]
+
+    future = _analyze_inflight.get(ticker)
+    if future is None:
+        metrics.inc('analyze_requests_total', source='fetch')
+        future = asyncio.get_running_loop().run_in_executor(None, _run_analysis, ticker)
+        future.add_done_callback(functools.partial(_analysis_done, ticker))
+        _analyze_inflight[ticker] = future
+    else:
+        metrics.inc('analyze_requests_total', source='coalesced')
+    # shield: client yang putus tidak membatalkan analisa yang ditunggu request lain
+    return await asyncio.shield(future)
+
+@app.get("/api/analyze/{ticker}")
+async def analyze_ticker(ticker: str):
+    ticker = universe.normalize(ticker)
+    if not TICKER_PATTERN.match(ticker):
+        raise HTTPException(status_code=400, detail="Ticker tidak valid")
+
+    try:
+        return await analyze(ticker)
+    except universe.TickerNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except universe.DataUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"❌ Analyze Error {ticker}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,186 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# --- METRIK: WAKTU PER TAHAP SCAN + PANGGILAN EKSTERNAL ---
+# 1. RunRecorder: satu per run scanner; tiap tahap (fetch, indicators, filter, ai,
+#    persistence, notification) dibungkus run.stage(...). Ringkasan disimpan ke tabel
+#    scan_runs (run_history.py) dan dibaca benchmark.py.
+# 2. inc() / observe(): counter & histogram global (format Prometheus, lihat /metrics
+#    di main.py). Kalau dipanggil di dalam run yang aktif, nilainya juga dijumlah ke
+#    counter run tersebut (yfinance, Gemini, DB, Telegram).
+
+PREFIX = "stockvision_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Registry:
+    """Counter, gauge & histogram sederhana (thread-safe) dengan output teks Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # name -> {labels: nilai}
+        self._gauges = {}
+        self._histograms = {}  # name -> {labels: [count per bucket, sum, count]}
+        self._buckets = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels_key(labels)] = value
+
+    def observe(self, name, value, count=1, buckets=DEFAULT_BUCKETS, **labels):
+        """count > 1: catat `count` observasi bernilai sama sekaligus (misal waktu per ticker satu chunk)."""
+        key = _labels_key(labels)
+        with self._lock:
+            buckets = self._buckets.setdefault(name, tuple(buckets))
+            series = self._histograms.setdefault(name, {})
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][i] += count
+            entry[1] += value * count
+            entry[2] += count
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(store.items()):
+                    full = PREFIX + name
+                    if name in self._help:
+                        lines.append(f"# HELP {full} {self._help[name]}")
+                    lines.append(f"# TYPE {full} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{full}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                full = PREFIX + name
+                buckets = self._buckets[name]
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, (counts, total, count) in sorted(series.items()):
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f"{full}_bucket{_format_labels(key, [('le', f'{bound:g}')])} {bucket_count}")
+                    lines.append(f"{full}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+                    lines.append(f"{full}_sum{_format_labels(key)} {total}")
+                    lines.append(f"{full}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("scan_stage_seconds", "Durasi tiap tahap scan")
+registry.describe("yf_fetch_seconds_per_ticker", "Waktu download yfinance dibagi jumlah ticker per request")
+registry.describe("ai_request_seconds", "Latency satu panggilan Gemini")
+registry.describe("db_write_seconds", "Durasi tulis sinyal ke DB")
+registry.describe("telegram_send_seconds", "Durasi satu kirim pesan Telegram")
+
+# Run yang sedang aktif di thread / konteks ini (ikut ke worker lewat contextvars.copy_context)
+_current_run = contextvars.ContextVar("scan_run", default=None)
+
+
+def _run_key(name, labels):
+    return name + "".join(f".{v}" for _, v in sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    registry.inc(name, value, **labels)
+    run = _current_run.get()
+    if run is not None:
+        run.count(_run_key(name, labels), value)
+
+
+def observe(name, value, count=1, **labels):
+    registry.observe(name, value, count=count, **labels)
+    run = _current_run.get()
+    if run is not None:
+        key = _run_key(name, labels)
+        run.count(key + ".sum", value * count)
+        run.count(key + ".count", count)
+
+
+@contextmanager
+def timed(name, **labels):
+    """Ukur blok kode ke histogram `name`. Label bisa diubah di dalam blok (misal outcome)."""
+    started = time.perf_counter()
+    try:
+        yield labels
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+class RunRecorder:
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._token = _current_run.set(self)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, counters, prefix=""):
+        """Tambahkan counter dari run lain (misal hasil shard di proses terpisah)."""
+        for name, value in counters.items():
+            self.count(prefix + name, value)
+
+    def close(self):
+        """Lepas run dari konteks aktif tanpa mencatat ke registry (dipakai shard)."""
+        try:
+            _current_run.reset(self._token)
+        except ValueError:
+            _current_run.set(None)  # dipanggil dari konteks lain
+
+    def finish(self, status="ok"):
+        duration = time.perf_counter() - self._t0
+        self.close()
+
+        registry.inc("scan_runs_total", scanner=self.scanner, status=status)
+        registry.observe("scan_duration_seconds", duration, scanner=self.scanner)
+        for stage, seconds in self.stages.items():
+            registry.observe("scan_stage_seconds", seconds, scanner=self.scanner, stage=stage)
+        return {
+            'scanner': self.scanner,
+            'status': status,
+            'started_at': self.started_at,
+            'duration': duration,
+            'stages': dict(self.stages),
+            'counters': dict(self.counters),
+        }
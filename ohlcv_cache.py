@@ -0,0 +1,333 @@
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from dotenv import load_dotenv
+import metrics
+
+# --- CACHE OHLCV LOKAL (INCREMENTAL) ---
+# Dipakai bersama oleh scanner.py & scanner_pribadi.py.
+# Bar disimpan di SQLite per interval: <CACHE_DIR>/ohlcv/<interval>.sqlite
+# Setiap run hanya download bar SETELAH timestamp terakhir yang tersimpan,
+# lalu window yang diminta dibaca dari disk.
+
+load_dotenv()
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+OHLCV_CACHE_ENABLED = os.getenv("OHLCV_CACHE_ENABLED", "1") != "0"
+# Jangan hit yfinance lagi kalau ticker baru saja di-refresh (detik)
+OHLCV_REFRESH_SECONDS = int(os.getenv("OHLCV_REFRESH_SECONDS", "60"))
+# Jumlah ticker per request yf.download (1 = satu request per saham)
+YF_CHUNK_SIZE = int(os.getenv("YF_CHUNK_SIZE", "50"))
+# Period 'Nd' di yfinance = N sesi bursa terakhir, bukan N hari kalender. Untuk bar harian
+# cache membaca window kalender yang lebih lebar (cadangan libur panjang, misal cuti bersama
+# Lebaran) lalu memotongnya ke N bar terakhir per ticker.
+OHLCV_HOLIDAY_BUFFER_DAYS = int(os.getenv("OHLCV_HOLIDAY_BUFFER_DAYS", "21"))
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+MARKET_TZ = 'Asia/Jakarta'
+
+# Error per ticker saat yfinance menjawab tapi tanpa bar (ticker tidak dikenal / delisted,
+# atau respon kosong). Error lain (exception / timeout) berarti sumber datanya yang gagal.
+NO_DATA = "Data kosong"
+NOT_LISTED = "Data tidak tersedia (delisted / gagal download)"
+
+# Batas parameter SQLite lama (999), jadi query IN (...) dipecah
+_SQL_CHUNK = 500
+
+
+def _connect(interval):
+    folder = os.path.join(CACHE_DIR, 'ohlcv')
+    os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(folder, f"{interval}.sqlite"), timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS bars (
+            ticker TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            open REAL, high REAL, low REAL, close REAL, volume REAL,
+            PRIMARY KEY (ticker, ts)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS coverage (
+            ticker TEXT PRIMARY KEY,
+            start TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+    """)
+    return conn
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def period_start(period, now=None):
+    """
+    Terjemahkan period gaya yfinance ('5d', '6mo', '1y', 'ytd', 'max') ke tanggal awal.
+    'Nd' di sini = N hari kalender; get_history yang menerjemahkannya ke N sesi bursa.
+    """
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now(tz=MARKET_TZ).tz_localize(None)
+    today = now.normalize()
+    period = period.lower()
+
+    if period == 'max':
+        return pd.Timestamp('1990-01-01')
+    if period == 'ytd':
+        return pd.Timestamp(year=today.year, month=1, day=1)
+
+    for unit, offset in (('mo', 'months'), ('wk', 'weeks'), ('d', 'days'), ('y', 'years')):
+        if period.endswith(unit):
+            return today - pd.DateOffset(**{offset: int(period[:-len(unit)])})
+
+    raise ValueError(f"Period tidak dikenal: {period}")
+
+
+def period_sessions(period):
+    """'5d' -> 5 (jumlah sesi bursa yang diminta), period lain -> None."""
+    period = period.lower()
+    if period.endswith('d') and period[:-1].isdigit():
+        return int(period[:-1])
+    return None
+
+
+def _last_bars(history, n):
+    """Sisakan n bar valid terakhir per ticker (baris yang kosong untuk semua ticker dibuang)."""
+    valid = history['Close'].notna()
+    from_end = valid[::-1].cumsum()[::-1]
+    keep = valid & (from_end <= n)
+    history = history.where(pd.concat({field: keep for field in FIELDS}, axis=1))
+    return history.loc[keep.any(axis=1)]
+
+
+def _naive_index(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert(MARKET_TZ).tz_localize(None)
+    return index
+
+
+def yf_start(ts, interval='1d'):
+    """
+    Timestamp cache (TS_FORMAT, jam bursa) -> argumen start yang diterima yfinance.
+    yfinance hanya parse string '%Y-%m-%d'; intraday butuh jam, jadi dikirim datetime ber-timezone.
+    """
+    ts = pd.Timestamp(ts)
+    if interval[-1] in 'mh':
+        return ts.tz_localize(MARKET_TZ).to_pydatetime()
+    return ts.strftime('%Y-%m-%d')
+
+
+def download_batch(tickers, period=None, start=None, interval='1d', chunk_size=YF_CHUNK_SIZE):
+    """
+    Download banyak ticker sekaligus (dipecah per chunk).
+    Return: (frame kolom MultiIndex (field, ticker), dict error per ticker)
+    """
+    chunk_size = max(1, int(chunk_size))
+    frames = []
+    errors = {}
+
+    for chunk in _chunks(list(tickers), chunk_size):
+        started = time.perf_counter()
+        try:
+            # auto_adjust=False disengaja: Close = harga penutupan asli (hanya disesuaikan split),
+            # bukan bawaan yfinance (disesuaikan dividen). Harga yang disesuaikan dividen berubah
+            # mundur ke semua bar lama setiap ex-date, sehingga bar di cache tidak cocok lagi dengan
+            # bar baru hasil fetch inkremental. Harga asli juga yang tampil di bursa / pesan sinyal.
+            # Split tetap mengubah bar lama: ticker yang split perlu cache-nya dihapus (download penuh).
+            df = yf.download(chunk, period=period, start=start, interval=interval,
+                             group_by='column', auto_adjust=False, progress=False, threads=True)
+        except Exception as e:
+            metrics.inc('yf_requests_total', interval=interval, status="error")
+            for ticker in chunk:
+                errors[ticker] = str(e)
+            continue
+        finally:
+            # Satu request berisi banyak ticker -> waktu dibagi rata per ticker
+            elapsed = time.perf_counter() - started
+            metrics.observe('yf_fetch_seconds_per_ticker', elapsed / len(chunk), count=len(chunk), interval=interval)
+        metrics.inc('yf_requests_total', interval=interval, status="ok")
+
+        if df is None or df.empty:
+            for ticker in chunk:
+                errors[ticker] = NO_DATA
+            continue
+
+        # yfinance versi lama mengembalikan kolom 1 level kalau cuma 1 ticker
+        if not isinstance(df.columns, pd.MultiIndex):
+            df.columns = pd.MultiIndex.from_product([df.columns, chunk])
+
+        df = df.reindex(columns=pd.MultiIndex.from_product([FIELDS, chunk]))
+        df.index = _naive_index(df.index)
+
+        # Ticker yang gagal di-download tetap muncul sebagai kolom NaN semua
+        close = df['Close']
+        for ticker in close.columns[close.isna().all()]:
+            errors[ticker] = NOT_LISTED
+
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex([]), columns=pd.MultiIndex.from_product([FIELDS, list(tickers)]),
+                            dtype=float), errors
+
+    return pd.concat(frames, axis=1).sort_index(), errors
+
+
+def _to_rows(frame):
+    """Frame lebar (field, ticker) -> list tuple untuk tabel bars."""
+    if frame.empty:
+        return []
+    tickers = frame['Close'].columns
+    ts = frame.index.strftime(TS_FORMAT)
+    long = pd.DataFrame({
+        'ticker': np.tile(tickers.to_numpy(), len(ts)),
+        'ts': np.repeat(ts.to_numpy(), len(tickers)),
+        **{field: frame[field].reindex(columns=tickers).to_numpy(dtype=float).ravel() for field in FIELDS},
+    })
+    long = long.dropna(subset=['Close'])
+    return list(long[['ticker', 'ts'] + FIELDS].itertuples(index=False, name=None))
+
+
+def _read_window(conn, tickers, start):
+    parts = []
+    for chunk in _chunks(list(tickers), _SQL_CHUNK):
+        marks = ",".join("?" * len(chunk))
+        parts.append(pd.read_sql_query(
+            f"SELECT ticker, ts, open, high, low, close, volume FROM bars "
+            f"WHERE ticker IN ({marks}) AND ts >= ? ORDER BY ts",
+            conn, params=chunk + [start.strftime(TS_FORMAT)],
+        ))
+    long = pd.concat(parts, ignore_index=True)
+
+    columns = pd.MultiIndex.from_product([FIELDS, list(tickers)])
+    if long.empty:
+        # Index tetap DatetimeIndex supaya filter tanggal di pemanggil (misal intraday) tetap jalan
+        return pd.DataFrame(index=pd.DatetimeIndex([]), columns=columns, dtype=float)
+
+    long.columns = ['ticker', 'ts'] + FIELDS
+    long['ts'] = pd.to_datetime(long['ts'], format=TS_FORMAT)
+    wide = long.pivot(index='ts', columns='ticker', values=FIELDS)
+    wide.index.name = None
+    wide.columns.names = [None, None]
+    return wide.reindex(columns=columns).sort_index()
+
+
+def _window(period, interval):
+    """(tanggal awal window yang dibaca, jumlah sesi yang disisakan per ticker atau None)."""
+    # Intraday: period hanya dipakai untuk sesi berjalan, tetap dihitung per hari kalender
+    sessions = period_sessions(period) if interval[-1] not in 'mh' else None
+    if sessions:
+        # ~5 sesi per 7 hari kalender, ditambah cadangan libur bursa
+        return period_start(f"{-(-sessions * 7 // 5) + OHLCV_HOLIDAY_BUFFER_DAYS}d"), sessions
+    return period_start(period), None
+
+
+def _fetch_plan(conn, tickers, start_str, interval, now):
+    """
+    Ticker yang perlu di-download, dikelompokkan per (tanggal mulai fetch, full) supaya
+    tetap bisa di-batch. Ticker yang baru saja di-refresh tidak ikut (langsung dibaca dari disk).
+    """
+    coverage = {}
+    last_ts = {}
+    for chunk in _chunks(tickers, _SQL_CHUNK):
+        marks = ",".join("?" * len(chunk))
+        for ticker, cov_start, fetched_at in conn.execute(
+                f"SELECT ticker, start, fetched_at FROM coverage WHERE ticker IN ({marks})", chunk):
+            coverage[ticker] = (cov_start, fetched_at)
+        for ticker, ts in conn.execute(
+                f"SELECT ticker, MAX(ts) FROM bars WHERE ticker IN ({marks}) GROUP BY ticker", chunk):
+            last_ts[ticker] = ts
+
+    groups = {}
+    for ticker in tickers:
+        cov = coverage.get(ticker)
+        if cov is not None and cov[0] <= start_str and now - cov[1] < OHLCV_REFRESH_SECONDS:
+            continue
+        if cov is None or cov[0] > start_str or ticker not in last_ts:
+            groups.setdefault((start_str, True), []).append(ticker)
+        else:
+            fetch_from = last_ts[ticker] if interval[-1] in 'mh' else last_ts[ticker][:10]
+            groups.setdefault((fetch_from, False), []).append(ticker)
+    return groups
+
+
+def has_bars(ticker, interval='1d'):
+    """Cache punya bar untuk ticker ini (walaupun refresh terakhirnya gagal)."""
+    if not OHLCV_CACHE_ENABLED:
+        return False
+    conn = _connect(interval)
+    try:
+        return conn.execute("SELECT 1 FROM bars WHERE ticker = ? LIMIT 1", (ticker,)).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def stale_tickers(tickers, period='6mo', interval='1d'):
+    """Ticker yang akan di-download get_history saat ini (belum ada di cache / sudah lewat refresh)."""
+    tickers = list(dict.fromkeys(tickers))
+    if not OHLCV_CACHE_ENABLED:
+        return tickers
+    start, _ = _window(period, interval)
+    conn = _connect(interval)
+    try:
+        groups = _fetch_plan(conn, tickers, start.strftime(TS_FORMAT), interval, time.time())
+    finally:
+        conn.close()
+    return [ticker for group in groups.values() for ticker in group]
+
+
+def get_history(tickers, period='6mo', interval='1d', chunk_size=YF_CHUNK_SIZE):
+    """
+    Ambil OHLCV untuk banyak ticker lewat cache lokal.
+    Hanya bar setelah timestamp terakhir yang di-download ulang (bar terakhir
+    ikut di-refresh karena candle hari ini masih bisa berubah).
+    Return: (frame kolom MultiIndex (field, ticker), dict error per ticker)
+    Ticker yang ada di dict error kolomnya NaN semua, walaupun cache-nya masih punya bar lama.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    if not OHLCV_CACHE_ENABLED:
+        return download_batch(tickers, period=period, interval=interval, chunk_size=chunk_size)
+
+    start, sessions = _window(period, interval)
+    start_str = start.strftime(TS_FORMAT)
+    now = time.time()
+    errors = {}
+
+    conn = _connect(interval)
+    try:
+        groups = _fetch_plan(conn, tickers, start_str, interval, now)
+        for (fetch_from, full), group in groups.items():
+            frame, group_errors = download_batch(group, start=yf_start(fetch_from, interval),
+                                                 interval=interval, chunk_size=chunk_size)
+            errors.update(group_errors)
+
+            fetched = [t for t in group if t not in group_errors]
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO bars (ticker, ts, open, high, low, close, volume) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", _to_rows(frame))
+                conn.executemany(
+                    "INSERT INTO coverage (ticker, start, fetched_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(ticker) DO UPDATE SET fetched_at = excluded.fetched_at, "
+                    "start = CASE WHEN ? THEN MIN(coverage.start, excluded.start) ELSE coverage.start END",
+                    [(t, fetch_from, now, int(full)) for t in fetched])
+
+        downloaded = sum(len(group) for group in groups.values())
+        metrics.inc('ohlcv_cache_tickers_total', len(tickers) - downloaded, interval=interval, source="cache")
+        metrics.inc('ohlcv_cache_tickers_total', downloaded, interval=interval, source="download")
+        if errors:
+            metrics.inc('yf_ticker_errors_total', len(errors), interval=interval)
+        history = _read_window(conn, tickers, start)
+        # Refresh gagal -> bar lama di cache tidak dipakai (sama seperti kode lama yang melewati
+        # ticker gagal), supaya kenaikan kemarin tidak terbaca sebagai sinyal hari ini
+        failed = history.columns.get_level_values(1).isin(list(errors))
+        if failed.any():
+            history.loc[:, failed] = np.nan
+        if sessions:
+            history = _last_bars(history, sessions)
+        return history, errors
+    finally:
+        conn.close()
@@ -0,0 +1,43 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe.
+    rate_per_minute token diisi ulang secara merata, maksimal `capacity` token tersimpan
+    (burst). acquire() memblokir thread pemanggil saja sampai token tersedia.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = max(float(rate_per_minute), 1e-9) / 60.0  # token per detik
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_minute / 6))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """Tunggu sampai token tersedia. Return lama menunggu (detik)."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
@@ -0,0 +1,103 @@
+import argparse
+import datetime
+import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, create_engine, text
+import signals_db
+
+# --- RETENTION detected_patterns ---
+# Baris yang lebih tua dari SIGNAL_RETENTION_DAYS dipindah ke detected_patterns_archive
+# (per batch, tiap batch 1 transaksi: INSERT ke arsip lalu DELETE dari tabel utama).
+# Tabel utama tetap kecil, jadi query history / stream hanya menyentuh data yang "panas".
+# Jalankan: python retention.py [--days 90] [--dry-run]   (atau lewat daemon, RETENTION_RUN_AT)
+
+load_dotenv()
+DB_URL = os.getenv("DB_URL")
+SIGNAL_RETENTION_DAYS = int(os.getenv("SIGNAL_RETENTION_DAYS", "90"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+
+COLUMNS = "id, ticker, pattern_name, price, story, created_at, scan_bucket"
+
+SELECT_BATCH = text(
+    "SELECT id FROM detected_patterns WHERE created_at < :cutoff ORDER BY id LIMIT :limit"
+)
+COPY_BATCH = text(
+    f"INSERT INTO detected_patterns_archive ({COLUMNS}) "
+    f"SELECT {COLUMNS} FROM detected_patterns WHERE id IN :ids ON CONFLICT (id) DO NOTHING"
+).bindparams(bindparam("ids", expanding=True))
+DELETE_BATCH = text("DELETE FROM detected_patterns WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+
+
+def ensure_archive(conn):
+    """Tabel arsip, kolom sama dengan detected_patterns (id dipertahankan)."""
+    price_type = "DOUBLE PRECISION" if conn.dialect.name == 'postgresql' else "REAL"
+    id_type = "BIGINT" if conn.dialect.name == 'postgresql' else "INTEGER"
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS detected_patterns_archive (
+            id {id_type} PRIMARY KEY,
+            ticker TEXT, pattern_name TEXT, price {price_type},
+            story TEXT, created_at TIMESTAMP, scan_bucket TEXT
+        )
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_detected_patterns_archive_created_at "
+        "ON detected_patterns_archive (created_at)"
+    ))
+
+
+def archive_old_signals(engine, days=SIGNAL_RETENTION_DAYS, batch_size=RETENTION_BATCH_SIZE, dry_run=False):
+    """Pindahkan sinyal lebih tua dari `days` hari ke arsip. Return jumlah baris yang dipindah."""
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    with engine.begin() as conn:
+        signals_db.ensure_schema(conn)
+        ensure_archive(conn)
+        if dry_run:
+            count = conn.execute(text("SELECT COUNT(*) FROM detected_patterns WHERE created_at < :cutoff"),
+                                 {"cutoff": cutoff}).scalar()
+            print(f"🧹 [DRY RUN] {count} baris sebelum {cutoff:%Y-%m-%d} akan diarsipkan")
+            return 0
+
+    moved = 0
+    started = time.perf_counter()
+    while True:
+        # Batch kecil per transaksi supaya lock tidak lama (scanner tetap bisa menulis)
+        with engine.begin() as conn:
+            ids = [row[0] for row in conn.execute(SELECT_BATCH, {"cutoff": cutoff, "limit": batch_size})]
+            if not ids:
+                break
+            conn.execute(COPY_BATCH, {"ids": ids})
+            conn.execute(DELETE_BATCH, {"ids": ids})
+        moved += len(ids)
+        if len(ids) < batch_size:
+            break
+
+    print(f"🧹 {moved} sinyal sebelum {cutoff:%Y-%m-%d} dipindah ke arsip "
+          f"dalam {time.perf_counter() - started:.1f} detik")
+    return moved
+
+
+_engine = None
+
+
+def run_retention():
+    """Entry point daemon: pakai DB_URL, engine dibuat sekali."""
+    global _engine
+    if not DB_URL:
+        print("[ERROR] DB_URL Kosong!")
+        return 0
+    if _engine is None:
+        _engine = create_engine(signals_db.sync_db_url(DB_URL), pool_pre_ping=True)
+    return archive_old_signals(_engine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arsipkan sinyal lama dari detected_patterns")
+    parser.add_argument("--days", type=int, default=SIGNAL_RETENTION_DAYS, help="Simpan N hari terakhir")
+    parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Hanya hitung baris yang akan dipindah")
+    args = parser.parse_args()
+
+    if not DB_URL:
+        parser.error("DB_URL kosong")
+    archive_old_signals(create_engine(signals_db.sync_db_url(DB_URL)), days=args.days, batch_size=args.batch_size, dry_run=args.dry_run)
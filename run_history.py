@@ -0,0 +1,107 @@
+import datetime
+import json
+import os
+from dotenv import load_dotenv
+from sqlalchemy import column, create_engine, insert, table, text
+import signals_db
+
+# --- RIWAYAT RUN SCANNER (TABEL scan_runs) ---
+# Setiap run scan_top_gainers / scan_local_portfolio disimpan 1 baris: status, durasi,
+# waktu per tahap dan counter panggilan eksternal (JSON). main.py membacanya untuk /metrics.
+# Scanner pribadi tidak memakai DB_URL (sinyal hanya ke Telegram); workflow-nya mengisi
+# RUN_HISTORY_DB_URL supaya riwayatnya ikut terbaca /metrics. Tanpa keduanya -> SQLite di CACHE_DIR.
+
+load_dotenv()
+RUN_HISTORY_DB_URL = os.getenv("RUN_HISTORY_DB_URL")
+
+scan_runs = table(
+    'scan_runs',
+    column('scanner'), column('status'), column('started_at'),
+    column('duration'), column('stages'), column('counters'),
+)
+
+
+def ensure_schema(conn):
+    """Buat tabel scan_runs kalau belum ada (koneksi sync, bisa lewat AsyncConnection.run_sync)."""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS scan_runs (
+                id BIGSERIAL PRIMARY KEY,
+                scanner TEXT, status TEXT, started_at TIMESTAMP,
+                duration DOUBLE PRECISION, stages TEXT, counters TEXT
+            )
+        """))
+    else:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS scan_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scanner TEXT, status TEXT, started_at TIMESTAMP,
+                duration REAL, stages TEXT, counters TEXT
+            )
+        """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_scan_runs_scanner_started_at ON scan_runs (scanner, started_at DESC)"
+    ))
+
+
+_engine = None
+
+
+def get_engine():
+    """RUN_HISTORY_DB_URL > DB_URL > SQLite lokal di CACHE_DIR."""
+    global _engine
+    if _engine is None:
+        url = RUN_HISTORY_DB_URL or os.getenv("DB_URL")
+        if not url:
+            # Import di sini: API (main.py) selalu punya DB_URL dan tidak perlu memuat yfinance
+            import ohlcv_cache
+            os.makedirs(ohlcv_cache.CACHE_DIR, exist_ok=True)
+            url = f"sqlite:///{os.path.join(ohlcv_cache.CACHE_DIR, 'run_history.sqlite')}"
+        _engine = create_engine(signals_db.sync_db_url(url), pool_pre_ping=True)
+    return _engine
+
+
+def save_run(summary, engine=None):
+    """
+    Simpan ringkasan dari metrics.RunRecorder.finish(). Gagal simpan tidak menggagalkan scan.
+    engine: pool DB scanner (dipakai kalau RUN_HISTORY_DB_URL tidak di-set).
+    """
+    if not summary:
+        return
+    row = {
+        'scanner': summary['scanner'],
+        'status': summary['status'],
+        'started_at': datetime.datetime.fromtimestamp(summary['started_at']),
+        'duration': summary['duration'],
+        'stages': json.dumps(summary['stages']),
+        'counters': json.dumps(summary['counters']),
+    }
+    try:
+        if RUN_HISTORY_DB_URL or engine is None:
+            engine = get_engine()
+        with engine.begin() as conn:
+            ensure_schema(conn)
+            conn.execute(insert(scan_runs).values(row))
+    except Exception as e:
+        print(f"   ⚠️ Gagal simpan riwayat run: {e}")
+
+
+def recent_runs(scanner, limit=10, engine=None):
+    """Ringkasan run terakhir scanner (terbaru dulu), dipakai estimasi waktu. Gagal baca -> []."""
+    try:
+        if RUN_HISTORY_DB_URL or engine is None:
+            engine = get_engine()
+        with engine.begin() as conn:
+            ensure_schema(conn)
+            rows = conn.execute(text(
+                "SELECT status, duration, stages, counters FROM scan_runs "
+                "WHERE scanner = :scanner ORDER BY started_at DESC LIMIT :limit"
+            ), {"scanner": scanner, "limit": limit}).fetchall()
+    except Exception as e:
+        print(f"   ⚠️ Gagal baca riwayat run: {e}")
+        return []
+    return [
+        {'status': status, 'duration': duration,
+         'stages': json.loads(stages or "{}"), 'counters': json.loads(counters or "{}")}
+        for status, duration, stages, counters in rows
+    ]
@@ -0,0 +1,117 @@
+import json
+import os
+import statistics
+import threading
+import time
+from dotenv import load_dotenv
+import ai_client
+import ohlcv_cache
+import run_history
+
+# --- BUDGET WAKTU SCAN + CHECKPOINT ---
+# private_scanner.yml dibatasi timeout-minutes; kalau job dibunuh di tengah jalan tidak ada
+# laporan yang terkirim. Dengan SCAN_BUDGET_SECONDS:
+# 1. Biaya per tahap diestimasi dari run sebelumnya (tabel scan_runs)
+# 2. Kandidat diproses sesuai prioritas; kandidat teratas dapat prompt utama selama sisa
+#    waktu masih cukup untuk prompt cadangan (murah) bagi kandidat sisanya, lalu turun ke
+#    prompt cadangan, dan kalau waktu benar-benar habis AI dilewati supaya laporan tetap terkirim
+# 3. Rencana AI yang sudah jadi disimpan ke checkpoint; run ulang di tanggal bursa yang sama
+#    melanjutkan dari situ. Checkpoint dihapus setelah laporan terkirim.
+
+load_dotenv()
+SCAN_BUDGET_SECONDS = float(os.getenv("SCAN_BUDGET_SECONDS", "0"))  # 0 = tanpa batas
+# Sisa waktu yang selalu disisihkan untuk simpan riwayat run / cache
+SCAN_BUDGET_MARGIN = float(os.getenv("SCAN_BUDGET_MARGIN", "30"))
+
+# Estimasi awal (detik) kalau belum ada riwayat run: 1 panggilan prompt utama (termasuk
+# kemungkinan tunggu 429), 1 panggilan prompt cadangan, dan seluruh tahap notifikasi
+DEFAULT_COSTS = {'ai_full': 30.0, 'ai_cheap': 10.0, 'notification': 20.0}
+
+
+def estimate_costs(scanner, limit=10):
+    """Median biaya dari `limit` run terakhir; yang belum pernah terukur pakai DEFAULT_COSTS."""
+    runs = run_history.recent_runs(scanner, limit)
+    samples = {name: [] for name in DEFAULT_COSTS}
+    for run in runs:
+        counters = run['counters']
+        for mode in ('ai_full', 'ai_cheap'):
+            if counters.get(mode):
+                samples[mode].append(counters.get(f"{mode}_seconds", 0.0) / counters[mode])
+        if 'notification' in run['stages']:
+            samples['notification'].append(run['stages']['notification'])
+
+    costs = {name: statistics.median(values) if values else DEFAULT_COSTS[name]
+             for name, values in samples.items()}
+    # Prompt cadangan tidak pernah lebih mahal dari prompt utama
+    costs['ai_cheap'] = min(costs['ai_cheap'], costs['ai_full'])
+    costs['runs'] = len(runs)
+    return costs
+
+
+class Budget:
+    def __init__(self, seconds=SCAN_BUDGET_SECONDS, costs=None, margin=SCAN_BUDGET_MARGIN):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds if seconds > 0 else None
+        self.costs = costs or dict(DEFAULT_COSTS)
+        self.margin = margin
+
+    def remaining(self):
+        return float('inf') if self.deadline is None else self.deadline - time.monotonic()
+
+    def _per_candidate(self, latency):
+        # Kandidat jalan paralel (AI_MAX_WORKERS) tapi tetap dibatasi token bucket AI_MAX_RPM
+        return max(latency / max(1, ai_client.AI_MAX_WORKERS), 60.0 / ai_client.AI_MAX_RPM)
+
+    def ai_mode(self, pending):
+        """
+        'full' / 'cheap' / 'skip' untuk kandidat berikutnya.
+        pending: jumlah kandidat yang belum mulai, termasuk kandidat ini.
+        """
+        if self.deadline is None:
+            return 'full'
+        left = self.remaining() - self.margin - self.costs['notification']
+        full = self._per_candidate(self.costs['ai_full'])
+        cheap = self._per_candidate(self.costs['ai_cheap'])
+        if left >= full + (pending - 1) * cheap:
+            return 'full'
+        if left >= cheap:
+            return 'cheap'
+        return 'skip'
+
+
+class Checkpoint:
+    """Progres run yang belum selesai: <CACHE_DIR>/checkpoint_<scanner>.json, berlaku per `key`."""
+
+    def __init__(self, scanner, key):
+        self.path = os.path.join(ohlcv_cache.CACHE_DIR, f"checkpoint_{scanner}.json")
+        self.key = key
+        self._lock = threading.Lock()
+        self.data = {'key': key, 'plans': {}}
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved.get('key') == key:
+                self.data.update(saved)
+        except (OSError, ValueError):
+            pass  # belum ada / rusak -> mulai dari awal
+
+    def plan(self, ticker):
+        return self.data['plans'].get(ticker)
+
+    def put_plan(self, ticker, plan):
+        with self._lock:
+            self.data['plans'][ticker] = plan
+            self._save()
+
+    def _save(self):
+        os.makedirs(ohlcv_cache.CACHE_DIR, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)  # atomic: job yang dibunuh tidak meninggalkan file setengah jadi
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
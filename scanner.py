@@ -1,36 +1,214 @@
 import os
 from dotenv import load_dotenv
-import yfinance as yf
 from sqlalchemy import create_engine
 import pandas as pd
 from google import genai 
-import time
+from google.genai import types
 import datetime
+import json
+import ohlcv_cache
+import ai_client
+import ai_cache
+import signals_db
+import intraday
+import metrics
+import run_history
+import screens
+import sharding
+import universe
 
 # --- 1. LOAD RAHASIA ---
 load_dotenv()
 DB_URL = os.getenv("DB_URL")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# 1 = semua Top Gainers dianalisis dalam 1 prompt JSON, 0 = 1 prompt per saham
+AI_BATCH_MODE = os.getenv("AI_BATCH_MODE", "1") != "0"
+# daily = bandingkan close harian (5 hari), intraday = bar 1m/5m terbaru vs prev close sesi
+GAINER_MODE = os.getenv("GAINER_MODE", "daily")
 
 client = genai.Client(api_key=GEMINI_API_KEY)
 
-def get_ai_analysis(ticker, price, change_pct):
+DAFTAR_50 = [
+    'BBRI.JK', 'BBCA.JK', 'BMRI.JK', 'TLKM.JK', 'ASII.JK', 'GOTO.JK', 'ANTM.JK', 'BRMS.JK',
+    'BUMI.JK', 'DEWA.JK', 'ADRO.JK', 'PTBA.JK', 'ITMG.JK', 'UNTR.JK', 'PGAS.JK', 'MEDC.JK',
+    'AMMN.JK', 'BBNI.JK', 'BRIS.JK', 'TPIA.JK', 'INKP.JK', 'TKIM.JK', 'KLBF.JK', 'UNVR.JK',
+    'ICBP.JK', 'INDF.JK', 'CPIN.JK', 'JPFA.JK', 'SMGR.JK', 'INTP.JK', 'MDKA.JK', 'MBMA.JK',
+    'HRUM.JK', 'AKRA.JK', 'BRPT.JK', 'ADMR.JK', 'BUKA.JK', 'BELI.JK', 'BSDE.JK', 'PWON.JK',
+    'CTRA.JK', 'SMRA.JK', 'JSMR.JK', 'SSIA.JK', 'ASPI.JK', 'PACK.JK', 'CBRE.JK', 'STRK.JK',
+    'CUAN.JK', 'BREN.JK'
+]
+
+def gainer_cache_key(ticker, price, change_pct):
+    # Saham yang sama dengan harga & kenaikan hampir sama di hari yang sama -> pakai jawaban lama
+    return (ticker, ai_cache.price_band(price), ai_cache.change_band(change_pct), ai_cache.trading_date())
+
+def get_ai_analysis(ticker, price, change_pct, check_cache=True):
     prompt = f"""
     Bertindaklah sebagai Analis Saham Day Trading.
     Saham: {ticker} | Harga: {price} | Naik: {change_pct:.2f}%
     Berikan komentar 1 kalimat singkat (Maks 10 kata).
     Fokus pada momentum kenaikan harga.
     """
+    cache_key = gainer_cache_key(ticker, price, change_pct)
+    if check_cache:
+        cached = ai_cache.get('gainer', *cache_key)
+        if cached:
+            return cached
+
     try:
-        response = client.models.generate_content(
+        response = ai_client.generate(
+            client,
             model='gemini-flash-latest', 
-            contents=prompt
+            contents=prompt,
+            label=ticker
         )
-        return response.text.strip()
+        story = response.text.strip()
+        ai_cache.put('gainer', story, *cache_key)
+        return story
     except Exception:
         return f"Momentum kuat, naik {change_pct:.1f}% hari ini."
 
-def scan_top_gainers():
+def parse_batch_comments(text, tickers):
+    """
+    Validasi jawaban JSON batch: [{"ticker": "BBRI.JK", "komentar": "..."}].
+    Return dict ticker -> komentar, hanya untuk entri yang valid.
+    """
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1:] if text.lower().startswith("json") else text
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    wanted = {t.upper(): t for t in tickers}
+    comments = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        ticker = str(item.get('ticker', '')).strip().upper()
+        if ticker and not ticker.endswith('.JK') and f"{ticker}.JK" in wanted:
+            ticker = f"{ticker}.JK"
+        comment = item.get('komentar')
+        if ticker not in wanted or not isinstance(comment, str):
+            continue
+        comment = comment.strip()
+        if comment and len(comment) <= 200 and wanted[ticker] not in comments:
+            comments[wanted[ticker]] = comment
+    return comments
+
+def get_ai_analysis_batch(stocks):
+    """
+    Satu panggilan Gemini untuk semua Top Gainers (jawaban JSON per ticker).
+    Return dict ticker -> komentar; ticker yang hilang / rusak tidak ikut.
+    """
+    daftar = "\n".join(
+        f"    - {s['ticker']} | Harga: {s['price']} | Naik: {s['change_pct']:.2f}%" for s in stocks
+    )
+    prompt = f"""
+    Bertindaklah sebagai Analis Saham Day Trading.
+    Untuk SETIAP saham di bawah, berikan komentar 1 kalimat singkat (Maks 10 kata).
+    Fokus pada momentum kenaikan harga.
+{daftar}
+
+    Jawab HANYA dengan JSON array, satu objek per saham:
+    [{{"ticker": "<kode saham persis seperti di atas>", "komentar": "<komentar>"}}]
+    """
+    try:
+        response = ai_client.generate(
+            client,
+            model='gemini-flash-latest',
+            contents=prompt,
+            config=types.GenerateContentConfig(response_mime_type="application/json"),
+            label="batch"
+        )
+        return parse_batch_comments(response.text, [s['ticker'] for s in stocks])
+    except Exception as e:
+        print(f"   [AI BATCH ERROR] {e}")
+        return {}
+
+def analyze_gainers(top_gainers):
+    """
+    Komentar AI untuk semua Top Gainers: cache dulu, lalu 1 prompt batch,
+    dan hanya ticker yang hilang / rusak yang jatuh ke get_ai_analysis per saham.
+    """
+    stories = {}
+    pending = []
+    for stock in top_gainers:
+        cached = ai_cache.get('gainer', *gainer_cache_key(stock['ticker'], stock['price'], stock['change_pct']))
+        if cached:
+            stories[stock['ticker']] = cached
+        else:
+            pending.append(stock)
+
+    if AI_BATCH_MODE and len(pending) > 1:
+        batch = get_ai_analysis_batch(pending)
+        for stock in pending:
+            if stock['ticker'] in batch:
+                stories[stock['ticker']] = batch[stock['ticker']]
+                ai_cache.put('gainer', batch[stock['ticker']],
+                             *gainer_cache_key(stock['ticker'], stock['price'], stock['change_pct']))
+        pending = [s for s in pending if s['ticker'] not in stories]
+        if pending:
+            print(f"   [AI BATCH] {len(pending)} ticker hilang/rusak, fallback per saham")
+
+    # Fallback per saham jalan paralel; tempo request diatur token bucket di ai_client (bukan sleep)
+    fallback = ai_client.run_concurrent(
+        lambda stock: get_ai_analysis(stock['ticker'], stock['price'], stock['change_pct'], check_cache=False),
+        pending
+    )
+    for stock, story in zip(pending, fallback):
+        stories[stock['ticker']] = story
+    return [stories[stock['ticker']] for stock in top_gainers]
+
+def gainer_table(close):
+    """
+    Hitung change_pct semua ticker sekaligus dari frame Close lebar.
+    Pakai 2 bar valid terakhir per ticker (sama seperti iloc[-1] / iloc[-2] per saham).
+    """
+    valid = close.notna()
+    # Jumlah bar valid dari baris ini sampai baris terakhir
+    from_end = valid[::-1].cumsum()[::-1]
+
+    last_price = close.where(valid & (from_end == 1)).max()
+    prev_close = close.where(valid & (from_end == 2)).max()
+
+    table = pd.DataFrame({
+        'price': last_price,
+        'change_pct': (last_price - prev_close) / prev_close * 100,
+        'bars': valid.sum(),
+    })
+    table.index.name = 'ticker'
+    return table
+
+def gainer_history_table(history):
+    return gainer_table(history['Close'])
+
+def select_gainers(table, top_n=15):
+    """Return: (semua gainer urut turun, top_n teratas), pattern_name dari screens.json"""
+    # Filter: data cukup (>= 2 bar), lalu screen 'gainers' (default: hanya yang naik)
+    gainers = screens.apply(table[table['bars'] >= 2], screens.load('gainers'))
+    gainers = gainers.sort_values('change_pct', ascending=False)
+    return gainers, gainers.head(top_n)
+
+
+_engine = None
+
+def get_engine():
+    """Engine DB dibuat sekali per proses, pool-nya dipakai ulang antar scan (mode daemon)."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(signals_db.sync_db_url(DB_URL), pool_pre_ping=True)
+    return _engine
+
+def scan_top_gainers(tickers=None):
+    """
+    tickers: universe yang dipindai (default: GAINERS_UNIVERSE / UNIVERSE_FILE, atau DAFTAR_50).
+    Return ringkasan waktu per tahap.
+    """
     print("--- STOCKVISION AI: TOP GAINERS SCANNER (DEBUG MODE) ---")
     
     if not DB_URL:
@@ -38,91 +216,86 @@ def scan_top_gainers():
         return
 
     try:
-        engine = create_engine(DB_URL)
+        engine = get_engine()
     except Exception as e:
         print(f"[FATAL] Koneksi DB Gagal: {e}")
         return
 
-    daftar_50 = [
-        'BBRI.JK', 'BBCA.JK', 'BMRI.JK', 'TLKM.JK', 'ASII.JK', 'GOTO.JK', 'ANTM.JK', 'BRMS.JK',
-        'BUMI.JK', 'DEWA.JK', 'ADRO.JK', 'PTBA.JK', 'ITMG.JK', 'UNTR.JK', 'PGAS.JK', 'MEDC.JK',
-        'AMMN.JK', 'BBNI.JK', 'BRIS.JK', 'TPIA.JK', 'INKP.JK', 'TKIM.JK', 'KLBF.JK', 'UNVR.JK',
-        'ICBP.JK', 'INDF.JK', 'CPIN.JK', 'JPFA.JK', 'SMGR.JK', 'INTP.JK', 'MDKA.JK', 'MBMA.JK',
-        'HRUM.JK', 'AKRA.JK', 'BRPT.JK', 'ADMR.JK', 'BUKA.JK', 'BELI.JK', 'BSDE.JK', 'PWON.JK',
-        'CTRA.JK', 'SMRA.JK', 'JSMR.JK', 'SSIA.JK', 'ASPI.JK', 'PACK.JK', 'CBRE.JK', 'STRK.JK',
-        'CUAN.JK', 'BREN.JK'
-    ]
-
-    results = []
-    
-    print(f"Memulai pemindaian {len(daftar_50)} saham...")
-    
-    for ticker in daftar_50:
-        try:
-            # PERBAIKAN: Ambil 5 hari (period='5d') biar aman saat Weekend
-            df = yf.download(ticker, period='5d', interval='1d', progress=False)
-            
-            if len(df) < 2: 
-                # Debugging: Kasih tahu kalau data kosong
-                # print(f"   [SKIP] {ticker}: Data tidak cukup ({len(df)} row)")
-                continue
-            
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-
-            last_price = float(df['Close'].iloc[-1])
-            prev_close = float(df['Close'].iloc[-2])
-            
-            # Hitung % Kenaikan
-            change_pct = ((last_price - prev_close) / prev_close) * 100
-            
-            # Filter: Hanya ambil yang naik (Gainers)
-            if change_pct > 0:
-                results.append({
-                    'ticker': ticker,
-                    'price': last_price,
-                    'change_pct': change_pct
-                })
-                print(f"   [FOUND] {ticker}: +{change_pct:.2f}%")
+    daftar_50 = tickers or universe.load("GAINERS_UNIVERSE", DAFTAR_50)
+    run = metrics.RunRecorder('scan_top_gainers')
 
-        except Exception as e:
-            print(f"   [ERROR] {ticker}: {e}")
+    print(f"Memulai pemindaian {len(daftar_50)} saham (mode {GAINER_MODE}, chunk {ohlcv_cache.YF_CHUNK_SIZE})...")
+
+    if GAINER_MODE == 'intraday':
+        # Cukup bar intraday terbaru; ranking dijaga incremental oleh heap di GainerTracker
+        with run.stage('fetch'):
+            top_gainers, errors = intraday.scan_intraday(daftar_50, top_n=15)
+        for ticker, err in errors.items():
+            print(f"   [ERROR] {ticker}: {err}")
+        with run.stage('filter'):
+            if top_gainers:
+                labeled = screens.apply(pd.DataFrame(top_gainers).set_index('ticker'), screens.load('gainers'))
+                top_gainers = labeled.reset_index().to_dict('records')
+        for stock in top_gainers:
+            print(f"   [FOUND] {stock['ticker']}: +{stock['change_pct']:.2f}%")
+    else:
+        # PERBAIKAN: Ambil 5 hari (period='5d') biar aman saat Weekend
+        # Lewat cache lokal: yang di-download cuma bar terbaru per ticker.
+        # Universe besar dipecah per shard (process pool), tabel change_pct digabung di sini.
+        table, errors = sharding.scan_shards(daftar_50, gainer_history_table, period='5d', run=run)
+        for ticker, err in errors.items():
+            print(f"   [ERROR] {ticker}: {err}")
+
+        with run.stage('filter'):
+            gainers, top = select_gainers(table, top_n=15)
+        for ticker, row in gainers.iterrows():
+            print(f"   [FOUND] {ticker}: +{row['change_pct']:.2f}%")
 
-    # Urutkan berdasarkan kenaikan tertinggi dan ambil 15 Teratas
-    top_gainers = sorted(results, key=lambda x: x['change_pct'], reverse=True)[:15]
+        # Urutkan berdasarkan kenaikan tertinggi dan ambil 15 Teratas
+        top_gainers = top.reset_index().to_dict('records')
 
+    run.count('tickers', len(daftar_50))
+    run.count('fetch_errors', len(errors))
+    run.count('signals', len(top_gainers))
     print(f"\n--- Memproses {len(top_gainers)} Top Gainers dengan AI ---")
 
-    for stock in top_gainers:
+    with run.stage('ai'):
+        stories = analyze_gainers(top_gainers)
+
+    now_wib = datetime.datetime.now()
+    rows = []
+    for stock, ai_story in zip(top_gainers, stories):
         ticker = stock['ticker']
         last_price = stock['price']
         change_pct = stock['change_pct']
+        # Label dari screen pertama yang cocok (default: > 5% STRONG BUY, sisanya NEUTRAL)
+        pattern_label = stock['pattern_name']
 
-        if change_pct > 5.0:
-            pattern_label = "AI SIGNAL: STRONG BUY (MOMENTUM)"
-        else:
-            pattern_label = "AI SIGNAL: NEUTRAL (GAINER)"
-
-        ai_story = get_ai_analysis(ticker, last_price, change_pct)
         print(f"   -> {ticker} (+{change_pct:.1f}%): {ai_story}")
 
-        now_wib = datetime.datetime.now()
-        data_to_save = pd.DataFrame({
-            'ticker': [ticker],
-            'pattern_name': [pattern_label],
-            'price': [last_price],
-            'story': [ai_story],
-            'created_at': [now_wib]
+        rows.append({
+            'ticker': ticker,
+            'pattern_name': pattern_label,
+            'price': float(last_price),
+            'story': ai_story,
+            'created_at': now_wib
         })
-        
+
+    # Semua sinyal disimpan sekaligus: 1 INSERT multi-baris dalam 1 transaksi
+    status = "ok"
+    with run.stage('persistence'):
         try:
-            data_to_save.to_sql('detected_patterns', engine, if_exists='append', index=False)
+            saved, elapsed = signals_db.save_signals(engine, rows)
+            print(f"   [DB] {saved} baris tersimpan ({signals_db.SIGNAL_WRITE_MODE}) dalam {elapsed*1000:.0f} ms")
         except Exception as e:
-            print(f"   [DB ERROR] Gagal simpan {ticker}: {e}")
-
-        time.sleep(2) 
+            status = "db_error"
+            print(f"   [DB ERROR] Gagal simpan {len(rows)} sinyal: {e}")
 
+    print(f"   🗃️ AI cache: {ai_cache.stats_line()}")
     print("\n--- SCAN SELESAI: DATABASE UPDATED ---")
+    summary = run.finish(status)
+    run_history.save_run(summary, engine)
+    return summary
 
 if __name__ == "__main__":
     scan_top_gainers()
\ No newline at end of file
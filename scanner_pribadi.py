@@ -1,185 +1,36 @@
 import os
 import time
-import requests
-import pandas as pd
-import yfinance as yf
+import indicators
+import indicator_state
+import ai_client
+import ai_cache
+import metrics
+import ohlcv_cache
+import run_history
+import scan_budget
+import screens
+import sharding
+import universe
+from telegram_dispatcher import TelegramDispatcher
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
 # --- 1. SETUP ---
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Di mode daemon kedua scanner jalan di 1 proses, jadi kunci pribadi bisa dipisah
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY_PRIBADI") or os.getenv("GEMINI_API_KEY")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 client = genai.Client(api_key=GEMINI_API_KEY)
 
-def send_telegram(message):
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message, "parse_mode": "Markdown"}
-        requests.post(url, json=payload)
-        print("   ✅ Pesan terkirim.")
-    except Exception as e:
-        print(f"   ❌ Gagal kirim Telegram: {e}")
-
-# --- 2. MAKRO EKONOMI ---
-# --- UPDATE FUNGSI INI (VERSI ANTI-GAGAL DENGAN RETRY) ---
-
-def get_global_market_sentiment():
-    print("\n🌍 Membaca kondisi pasar Global & IHSG...")
-    
-    prompt = """
-    Analisis singkat pasar hari ini: IHSG, Rupiah (IDR/USD), dan Harga Komoditas (Emas/Minyak/CPO).
-    Apakah Risk-On (Berani Beli) atau Risk-Off (Hati-hati)?
-    Jawab 1 kalimat. Contoh: "Pasar Risk-Off, IHSG merah -1%, Rupiah melemah."
-    """
-    
-    # MEKANISME RETRY (Loop 3x seperti di fungsi analisis saham)
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = client.models.generate_content(
-                model='gemini-flash-latest',
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    tools=[types.Tool(google_search=types.GoogleSearch())],
-                    temperature=0.1
-                )
-            )
-            if response.candidates and response.candidates[0].content.parts:
-                sentiment = response.candidates[0].content.parts[0].text.strip()
-                print(f"   👉 Sentimen: {sentiment}")
-                return sentiment
-                
-        except Exception as e:
-            # Jika error karena Kuota Habis (429) atau Masalah Koneksi
-            if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e) or "500" in str(e):
-                wait_time = 30
-                print(f"   ⏳ Koneksi/Kuota Sibuk! Menunggu {wait_time} detik... ({attempt+1}/{max_retries})")
-                time.sleep(wait_time)
-                continue # Coba lagi
-            else:
-                print(f"   ⚠️ Error Sentimen: {e}")
-                break # Error lain (misal API Key salah), stop.
-
-    # Jika sudah dicoba 3x masih gagal juga
-    return "Pasar Netral (Data Tidak Terbaca)"
-
-# --- 3. OTAK PRO (AI + RISK CALCULATION + STRICT TABLE) ---
-def get_pro_swing_advice(ticker, price, rsi, ma20, volume_status, market_context):
-    print(f"   🧠 AI sedang menganalisis {ticker}...")
-    
-    # Hitung data risiko untuk disuapkan ke AI
-    risk_per_share = price - ma20
-    risk_percent = (risk_per_share / price) * 100
-    
-    # PROMPT UTAMA (Versi "Galak" - Wajib Tabel)
-    prompt_utama = f"""
-    Role: Trading Signal Bot (NOT Assistant).
-    Context: "{market_context}"
-    Data: {ticker} | Price: {price} | MA20: {ma20} | RSI: {rsi:.1f} | Vol: {volume_status}
-    
-    TASK:
-    Analyze news (7 days) & technicals. Decide BUY/WAIT/SKIP.
-    
-    CRITICAL INSTRUCTION:
-    1. NO conversational fillers (Do not say "Sure", "Here is the analysis").
-    2. OUTPUT MUST BE ONLY THE TABLE BELOW.
-    3. Use Bahasa Indonesia for the content inside the table.
-    
-    REQUIRED OUTPUT FORMAT:
-    | PARAMETER | VALUE |
-    | :--- | :--- |
-    | 🎯 ACTION | [🟢 BUY / 🔴 WAIT / ⚫ SKIP] |
-    | 📝 ALASAN | [Sebutkan berita/teknikal dalam 1 kalimat pendek] |
-    | 💰 AREA BELI | [Range Harga, misal: {price}-{price+10}] |
-    | 🚀 TARGET | [Harga Jual, misal: {price*1.05:.0f}] |
-    | 🛑 STOP LOSS | [Harga dibawah {ma20:.0f}] |
-    """
-    
-    # PROMPT CADANGAN (Emergency Mode)
-    prompt_cadangan = f"""
-    Buatkan Tabel Sinyal Trading untuk saham {ticker} (Harga {price}, MA20 {ma20}).
-    Format Tabel: ACTION, ALASAN, AREA BELI, TARGET, STOP LOSS.
-    JANGAN pakai basa-basi. Langsung Tabel.
-    """
-
-    # --- MEKANISME RETRY PINTAR (Loop 3x) ---
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            # Gunakan 'gemini-1.5-flash' (Kuota Besar & Stabil)
-            response = client.models.generate_content(
-                model='gemini-flash-latest', 
-                contents=prompt_utama,
-                config=types.GenerateContentConfig(
-                    tools=[types.Tool(google_search=types.GoogleSearch())], 
-                    temperature=0.1 # Rendah agar AI patuh format
-                )
-            )
-            
-            if response.candidates and response.candidates[0].content.parts:
-                return response.candidates[0].content.parts[0].text.strip()
-                
-        except Exception as e:
-            # Cek jika errornya adalah Kuota Habis (429)
-            if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-                wait_time = 30 # Tunggu 30 detik
-                print(f"   ⏳ Kuota Limit! Menunggu {wait_time} detik... ({attempt+1}/{max_retries})")
-                time.sleep(wait_time) 
-                continue # Coba lagi
-            else:
-                # Jika error lain, langsung switch ke cadangan
-                break 
-
-    # --- JIKA UTAMA GAGAL, PAKAI CADANGAN (TANPA SEARCH) ---
-    try:
-        response = client.models.generate_content(
-            model='gemini-flash-latest', 
-            contents=prompt_cadangan,
-            config=types.GenerateContentConfig(temperature=0.1)
-        )
-        if response.candidates and response.candidates[0].content.parts:
-             return response.candidates[0].content.parts[0].text.strip()
-    except Exception:
-        pass
-
-    return "⚠️ Data tidak tersedia (Cek Koneksi)."
-
-# --- 4. SCANNER UTAMA ---
-import os
-import time
-import requests
-import pandas as pd
-import yfinance as yf
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-
-# --- 1. SETUP ---
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-
-client = genai.Client(api_key=GEMINI_API_KEY)
+# Satu dispatcher per proses: session HTTP & token bucket dipakai ulang
+telegram = TelegramDispatcher(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID)
 
 def send_telegram(message):
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        # disable_web_page_preview=True agar link stockbit tidak bikin preview gambar besar
-        payload = {
-            "chat_id": TELEGRAM_CHAT_ID, 
-            "text": message, 
-            "parse_mode": "Markdown", 
-            "disable_web_page_preview": True 
-        }
-        requests.post(url, json=payload)
+    if telegram.send(message):
         print("   ✅ Pesan terkirim.")
-    except Exception as e:
-        print(f"   ❌ Gagal kirim Telegram: {e}")
 
 # --- 2. MAKRO EKONOMI (STABIL) ---
 def get_global_market_sentiment():
@@ -189,24 +40,38 @@ def get_global_market_sentiment():
     Apakah Risk-On (Berani Beli) atau Risk-Off (Hati-hati)?
     Jawab 1 kalimat. Contoh: "Pasar Risk-Off, IHSG merah -1%, Rupiah melemah."
     """
+    cached = ai_cache.get('sentiment', ai_cache.trading_date())
+    if cached:
+        print(f"   👉 Sentimen (cache): {cached}")
+        return cached
+
     try:
-        response = client.models.generate_content(
+        response = ai_client.generate(
+            client,
             model='gemini-1.5-flash',
             contents=prompt,
             config=types.GenerateContentConfig(
                 tools=[types.Tool(google_search=types.GoogleSearch())],
                 temperature=0.1
-            )
+            ),
+            label="Sentimen"
         )
-        if response.candidates and response.candidates[0].content.parts:
-            sentiment = response.candidates[0].content.parts[0].text.strip()
+        sentiment = ai_client.response_text(response)
+        if sentiment:
+            ai_cache.put('sentiment', sentiment, ai_cache.trading_date())
             print(f"   👉 Sentimen: {sentiment}")
             return sentiment
-    except: return "Pasar Netral (Data Gagal)"
+    except Exception as e:
+        print(f"   ⚠️ Error Sentimen: {e}")
+    return "Pasar Netral (Data Gagal)"
 
 # --- 3. OTAK PRO (AI + TABEL STRICT + RETRY) ---
-def get_pro_swing_advice(ticker, price, rsi, ma20, volume_status, market_context):
-    print(f"   🧠 AI sedang menganalisis {ticker}...")
+PLAN_UNAVAILABLE = "⚠️ Data tidak tersedia (Cek Koneksi)."
+PLAN_SKIPPED = "⏭️ Analisa AI dilewati (waktu scan habis)."
+
+def get_pro_swing_advice(ticker, price, rsi, ma20, volume_status, market_context, cheap=False):
+    """cheap=True: langsung prompt cadangan (1 percobaan), dipakai saat budget waktu menipis."""
+    print(f"   🧠 AI sedang menganalisis {ticker}{' (mode hemat)' if cheap else ''}...")
     
     # Prompt Utama (Versi "Galak" - WAJIB TABEL)
     prompt_utama = f"""
@@ -239,161 +104,227 @@ def get_pro_swing_advice(ticker, price, rsi, ma20, volume_status, market_context
     JANGAN pakai basa-basi. Langsung Tabel.
     """
 
-    # --- MEKANISME RETRY PINTAR (Loop 3x) ---
-    max_retries = 3
-    for attempt in range(max_retries):
+    cache_key = (ticker, ai_cache.price_band(price), int(rsi // 5), ai_cache.trading_date())
+    cached = ai_cache.get('swing', *cache_key)
+    if cached:
+        return cached
+
+    # --- MEKANISME RETRY PINTAR (Rate limit + backoff per panggilan) ---
+    if not cheap:
         try:
-            response = client.models.generate_content(
+            response = ai_client.generate(
+                client,
                 model='gemini-1.5-flash', 
                 contents=prompt_utama,
                 config=types.GenerateContentConfig(
                     tools=[types.Tool(google_search=types.GoogleSearch())], 
                     temperature=0.1 
-                )
+                ),
+                label=ticker
             )
-            
-            if response.candidates and response.candidates[0].content.parts:
-                return response.candidates[0].content.parts[0].text.strip()
-                
-        except Exception as e:
-            if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-                wait_time = 30
-                print(f"   ⏳ Kuota Limit! Menunggu {wait_time} detik... ({attempt+1}/{max_retries})")
-                time.sleep(wait_time) 
-                continue 
-            else:
-                break 
+            plan = ai_client.response_text(response)
+            if plan:
+                ai_cache.put('swing', plan, *cache_key)
+                return plan
+        except Exception:
+            pass # Jika retry habis / error lain, langsung switch ke cadangan
 
     # --- MODE CADANGAN ---
     try:
-        response = client.models.generate_content(
+        response = ai_client.generate(
+            client,
             model='gemini-flash-latest', 
             contents=prompt_cadangan,
-            config=types.GenerateContentConfig(temperature=0.1)
+            config=types.GenerateContentConfig(temperature=0.1),
+            max_retries=1
         )
-        if response.candidates and response.candidates[0].content.parts:
-             return response.candidates[0].content.parts[0].text.strip()
+        plan = ai_client.response_text(response)
+        if plan:
+            return plan
     except Exception:
         pass
 
-    return "⚠️ Data tidak tersedia (Cek Koneksi)."
+    return PLAN_UNAVAILABLE
 
 # --- 4. SCANNER UTAMA (FITUR BARU + LOGIKA LAMA) ---
-def scan_local_portfolio():
+# DAFTAR SAHAM (Sama Persis dengan Punya Anda)
+WATCHLIST = [
+    'TLKM.JK', 'ASII.JK', 'UNTR.JK', 'ICBP.JK', 'INDF.JK', 'KLBF.JK', 
+    'MDKA.JK', 'ANTM.JK', 'ADRO.JK', 'PTBA.JK', 'PGAS.JK', 'AKRA.JK', 
+    'AMMN.JK', 'BRIS.JK', 'CPIN.JK', 'JPFA.JK', 'SMGR.JK', 'JSMR.JK', 
+    'MYOR.JK', 'HRUM.JK', 'MEDC.JK', 'ISAT.JK', 'EXCL.JK', 'MAPI.JK', 
+    'ACES.JK', 'INKP.JK', 'TKIM.JK', 'LSIP.JK'
+]
+
+def _indicator_table():
+    return indicator_state.build_indicator_table if indicator_state.INDICATOR_STATE_ENABLED \
+        else indicators.build_indicator_table
+
+def scan_local_portfolio(tickers=None, budget_seconds=None):
+    """
+    tickers: watchlist yang dipindai (default: PORTFOLIO_UNIVERSE / UNIVERSE_FILE, atau WATCHLIST).
+    budget_seconds: batas waktu total (default SCAN_BUDGET_SECONDS, 0 = tanpa batas).
+    Return ringkasan waktu per tahap.
+    """
     print("\n" + "="*60)
     print("   🚀 STOCKVISION PRO: SMART EXECUTION EDITION")
     print("="*60 + "\n")
     
-    # DAFTAR SAHAM (Sama Persis dengan Punya Anda)
-    watchlist = [
-        'TLKM.JK', 'ASII.JK', 'UNTR.JK', 'ICBP.JK', 'INDF.JK', 'KLBF.JK', 
-        'MDKA.JK', 'ANTM.JK', 'ADRO.JK', 'PTBA.JK', 'PGAS.JK', 'AKRA.JK', 
-        'AMMN.JK', 'BRIS.JK', 'CPIN.JK', 'JPFA.JK', 'SMGR.JK', 'JSMR.JK', 
-        'MYOR.JK', 'HRUM.JK', 'MEDC.JK', 'ISAT.JK', 'EXCL.JK', 'MAPI.JK', 
-        'ACES.JK', 'INKP.JK', 'TKIM.JK', 'LSIP.JK'
-    ]
+    watchlist = tickers or universe.load("PORTFOLIO_UNIVERSE", WATCHLIST)
+    run = metrics.RunRecorder('scan_local_portfolio')
+
+    # Budget dihitung sejak scan mulai; estimasi biaya dari riwayat scan_runs
+    if budget_seconds is None:
+        budget_seconds = scan_budget.SCAN_BUDGET_SECONDS
+    costs = scan_budget.estimate_costs('scan_local_portfolio') if budget_seconds > 0 else None
+    budget = scan_budget.Budget(budget_seconds, costs)
+    if costs:
+        print(f"⏱️ Budget {budget_seconds:.0f} detik | estimasi AI {costs['ai_full']:.1f}s (hemat "
+              f"{costs['ai_cheap']:.1f}s) per kandidat, notifikasi {costs['notification']:.1f}s "
+              f"(dari {costs['runs']} run)")
+    checkpoint = scan_budget.Checkpoint('scan_local_portfolio', ai_cache.trading_date())
+    if checkpoint.data['plans']:
+        print(f"♻️ Melanjutkan checkpoint: {len(checkpoint.data['plans'])} rencana AI sudah jadi")
     
-    market_sentiment = get_global_market_sentiment()
+    with run.stage('ai'):
+        market_sentiment = get_global_market_sentiment()
     candidates = []
     
     print("\n🔍 Tahap 1: Technical & Volume Screening...")
-    for ticker in watchlist:
-        try:
-            df = yf.download(ticker, period='6mo', interval='1d', progress=False)
-            if len(df) < 50: continue
-            if isinstance(df.columns, pd.MultiIndex): df.columns = df.columns.get_level_values(0)
-
-            # --- INDIKATOR DASAR (Sama Persis) ---
-            df['MA20'] = df['Close'].rolling(window=20).mean()
-            delta = df['Close'].diff(1)
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            df['RSI'] = 100 - (100 / (1 + rs))
-            
-            # --- VOLUME ANALYSIS (Sama Persis) ---
-            vol_avg = df['Volume'].iloc[-20:].mean()
-            vol_now = df['Volume'].iloc[-1]
-            vol_ratio = vol_now / vol_avg
-            
-            if vol_ratio > 1.2: vol_status = "🔥 High Volume (Akumulasi)"
-            elif vol_ratio < 0.8: vol_status = "❄️ Low Volume (Sepi)"
-            else: vol_status = "Normal Volume"
-
-            # --- [FITUR BARU 1] SHADOW ANALYSIS (Deteksi Jejak Guyuran) ---
-            # Bagian ini hanya menambah INFO, tidak memfilter saham
-            high = float(df['High'].iloc[-1])
-            low = float(df['Low'].iloc[-1])
-            close = float(df['Close'].iloc[-1])
-            open_price = float(df['Open'].iloc[-1])
-            
-            candle_range = high - low
-            if candle_range == 0: candle_range = 1 
-            
-            upper_shadow = high - max(close, open_price)
-            shadow_ratio = upper_shadow / candle_range
-            
-            if shadow_ratio > 0.4:
-                orderbook_note = "⚠️ Awas Guyuran (Ekor Atas Panjang)"
-            else:
-                orderbook_note = "✅ Selling Pressure Rendah"
-
-            lp = close
-            ma20 = float(df['MA20'].iloc[-1])
-            rsi = float(df['RSI'].iloc[-1])
+    # Semua watchlist diambil lewat cache lokal (hanya bar baru yang di-download).
+    # --- INDIKATOR (MA20, RSI14, VOLUME RATIO, SHADOW RATIO) SEMUA TICKER SEKALIGUS ---
+    # Rumus sama persis dengan versi rolling pandas lama, tapi dihitung dalam 1 pass NumPy.
+    # Universe besar dipecah per shard (process pool), tabel indikator digabung di sini.
+    # Default lewat state incremental: hanya bar baru sejak run terakhir yang dihitung.
+    table, errors = sharding.scan_shards(watchlist, _indicator_table(), period='6mo', run=run)
+    for ticker, err in errors.items():
+        print(f"   ⚠️ {ticker}: {err}")
 
-            # --- LOGIC FILTER (SAMA PERSIS DENGAN KODE LAMA ANDA) ---
-            # 1. Uptrend (Harga > MA20)
-            # 2. RSI Sehat (40 - 65)
-            # 3. Volume Likuid (> 500k)
-            if lp > ma20 and 40 <= rsi <= 65:
-                if vol_avg > 500000:
-                    candidates.append({
-                        'ticker': ticker, 'price': lp, 'rsi': rsi, 
-                        'ma20': ma20, 'vol_status': vol_status,
-                        'ob_note': orderbook_note # Info tambahan disimpan
-                    })
-                    print(f"   ✨ Lolos: {ticker} | {vol_status}")
-
-        except: continue
+    # --- LOGIC FILTER (screens.json, default SAMA PERSIS DENGAN KODE LAMA ANDA) ---
+    # 1. Uptrend (Harga > MA20)
+    # 2. RSI Sehat (40 - 65)
+    # 3. Volume Likuid (> 500k)
+    with run.stage('filter'):
+        lolos = screens.apply(table, screens.load('portfolio'))
+    for ticker, row in lolos.iterrows():
+        candidates.append({
+            'ticker': ticker, 'price': float(row['price']), 'rsi': float(row['rsi']),
+            'ma20': float(row['ma20']), 'vol_status': row['vol_status'],
+            'ob_note': row['ob_note'], # Info tambahan disimpan
+            'pattern_name': row['pattern_name']
+        })
+        print(f"   ✨ Lolos: {ticker} | {row['pattern_name']} | {row['vol_status']}")
 
     if candidates:
         print(f"\n🔍 Tahap 2: AI Risk Assessment...")
         # Prioritas tetap sama: Volume Tinggi dulu
-        candidates = sorted(candidates, key=lambda x: (x['vol_status'] != "🔥 High Volume (Akumulasi)", x['rsi']))
+        candidates = sorted(candidates, key=lambda x: (x['vol_status'] != indicators.HIGH_VOLUME, x['rsi']))
         
         header = f"🦅 *STOCKVISION PRO*\n📅 {time.strftime('%d-%m-%Y')}\n"
         header += f"🌍 _Sentiment: {market_sentiment}_\n"
-        send_telegram(header)
         
-        for stock in candidates:
-            # Hitung Risiko Rupiah
-            risk_rupiah = (stock['price'] - stock['ma20']) * 100
-            
-            # Panggil AI (Strict Table)
+        def plan_for(item):
+            index, stock = item
+            plan = checkpoint.plan(stock['ticker'])
+            if plan:
+                run.count('ai_resumed')
+                return plan
+            # Mode diputuskan saat kandidat mulai (urut prioritas) dari sisa budget
+            mode = budget.ai_mode(len(candidates) - index)
+            if mode == 'skip':
+                run.count('ai_skipped')
+                return PLAN_SKIPPED
+            started = time.perf_counter()
             plan = get_pro_swing_advice(
-                stock['ticker'], stock['price'], stock['rsi'], 
-                stock['ma20'], stock['vol_status'], market_sentiment
+                stock['ticker'], stock['price'], stock['rsi'],
+                stock['ma20'], stock['vol_status'], market_sentiment, cheap=(mode == 'cheap')
             )
+            run.count(f'ai_{mode}')
+            run.count(f'ai_{mode}_seconds', time.perf_counter() - started)
+            if plan != PLAN_UNAVAILABLE:
+                checkpoint.put_plan(stock['ticker'], plan)
+            return plan
+
+        # Panggil AI (Strict Table) untuk semua kandidat secara paralel, dibatasi token bucket
+        with run.stage('ai'):
+            plans = ai_client.run_concurrent(plan_for, list(enumerate(candidates)))
+
+        reports = [header]
+        for stock, plan in zip(candidates, plans):
+            # Hitung Risiko Rupiah
+            risk_rupiah = (stock['price'] - stock['ma20']) * 100
             
             # [FITUR BARU 2] Buat Link Pintas (Deep Link)
             clean_ticker = stock['ticker'].replace('.JK', '')
             link_sb = f"https://stockbit.com/symbol/{clean_ticker}"
             
             msg = f"💎 *{stock['ticker']}* (Rp {stock['price']:.0f})\n"
+            msg += f"   🏷️ Screen: {stock['pattern_name']}\n"
             msg += f"   📊 Vol: {stock['vol_status']}\n"
             msg += f"   🛡️ OB Info: _{stock['ob_note']}_\n" # Info Guyuran
             msg += f"{plan}\n"
             msg += f"⚠️ *RISIKO PER LOT:* -Rp {risk_rupiah:,.0f}\n" 
             msg += f"📲 [Cek Orderbook di Stockbit]({link_sb})" # Link Klik
             
-            send_telegram(msg)
-            print("   ...Cooldown 10 detik...")
-            time.sleep(10)
-            
-        send_telegram("✅ *Sesi Selesai.*")
+            reports.append(msg)
+
+        reports.append("✅ *Sesi Selesai.*")
+        # Laporan digabung ke sesedikit mungkin pesan (maks 4096 karakter), tempo diatur token bucket
+        with run.stage('notification'):
+            telegram.send_batch(reports)
+        print(f"   🗃️ AI cache: {ai_cache.stats_line()}")
     else:
-        send_telegram(f"Market Tidak Mendukung. ({market_sentiment}) 😴")
+        with run.stage('notification'):
+            send_telegram(f"Market Tidak Mendukung. ({market_sentiment}) 😴")
+
+    run.count('tickers', len(watchlist))
+    run.count('fetch_errors', len(errors))
+    run.count('signals', len(candidates))
+    print(telegram.report())
+    if run.counters.get('telegram_messages_total.failed'):
+        status = "telegram_error"  # checkpoint disimpan: run ulang tidak perlu panggil AI lagi
+    else:
+        checkpoint.clear()
+        status = "budget_low" if run.counters.get('ai_cheap') or run.counters.get('ai_skipped') else "ok"
+    summary = run.finish(status)
+    run_history.save_run(summary)
+    return summary
+
+# --- 5. ANALISA SATU SAHAM (ON-DEMAND, DIPAKAI /api/analyze DI main.py) ---
+def analyze_ticker(ticker):
+    """
+    Indikator + rencana trading AI untuk satu ticker, rumus sama dengan scan_local_portfolio.
+    universe.TickerNotFound kalau ticker tidak punya bar sama sekali / belum cukup bar,
+    universe.DataUnavailable kalau pengambilan datanya yang gagal.
+    """
+    history, errors = ohlcv_cache.get_history([ticker], period='6mo')
+    if ticker in errors:
+        if errors[ticker] in (ohlcv_cache.NO_DATA, ohlcv_cache.NOT_LISTED) and not ohlcv_cache.has_bars(ticker):
+            raise universe.TickerNotFound(f"{ticker}: {errors[ticker]}")
+        # Yahoo error / timeout, atau ticker yang dikenal tapi refresh-nya gagal
+        raise universe.DataUnavailable(f"{ticker}: data harga gagal diambil ({errors[ticker]})")
+    table = _indicator_table()(history)
+    if ticker not in table.index:
+        raise universe.TickerNotFound(f"{ticker}: data kurang dari {indicators.MIN_BARS} bar")
+
+    row = table.loc[ticker]
+    lolos = screens.apply(table, screens.load('portfolio'))
+    market_sentiment = get_global_market_sentiment()
+    plan = get_pro_swing_advice(ticker, float(row['price']), float(row['rsi']),
+                                float(row['ma20']), row['vol_status'], market_sentiment)
+    return {
+        'ticker': ticker,
+        'price': float(row['price']),
+        'ma20': float(row['ma20']),
+        'rsi': float(row['rsi']),
+        'vol_ratio': float(row['vol_ratio']),
+        'vol_status': row['vol_status'],
+        'ob_note': row['ob_note'],
+        'screen': lolos.loc[ticker, 'pattern_name'] if ticker in lolos.index else None,
+        'market_sentiment': market_sentiment,
+        'plan': plan,
+        'analyzed_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
 
 if __name__ == "__main__":
     scan_local_portfolio()
@@ -0,0 +1,151 @@
+import ast
+import functools
+import json
+import operator
+import os
+import numpy as np
+from dotenv import load_dotenv
+import metrics
+
+# --- SCREEN DEKLARATIF (screens.json) ---
+# Aturan screening tidak lagi hard-coded di scanner. Tiap screen berisi ekspresi atas
+# kolom tabel indikator, misal: "price > ma20 and 40 <= rsi <= 65 and vol_avg > 500000".
+# Ekspresi di-parse sekali (hanya node AST yang di-whitelist, tanpa eval) lalu di-compile
+# jadi fungsi NumPy. Kolom yang dipakai beberapa screen diambil sekali, lalu semua screen
+# dievaluasi atas seluruh universe dalam satu pass vektor. Screen pertama (urutan file)
+# yang cocok menentukan pattern_name baris tersebut.
+
+load_dotenv()
+SCREENS_FILE = os.getenv("SCREENS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "screens.json"))
+
+# Nama yang boleh dipakai di ekspresi (kolom tabel indikator / tabel gainer)
+INDICATORS = ('price', 'change_pct', 'ma20', 'rsi', 'vol_avg', 'vol_ratio', 'shadow_ratio', 'bars')
+
+# Dipakai kalau screens.json tidak ada / tidak punya screen valid untuk scanner tersebut
+DEFAULT_SCREENS = [
+    {'name': 'gainer_momentum', 'scanner': 'gainers', 'when': 'change_pct > 5',
+     'pattern_name': 'AI SIGNAL: STRONG BUY (MOMENTUM)'},
+    {'name': 'gainer', 'scanner': 'gainers', 'when': 'change_pct > 0',
+     'pattern_name': 'AI SIGNAL: NEUTRAL (GAINER)'},
+    {'name': 'swing_uptrend', 'scanner': 'portfolio',
+     'when': 'price > ma20 and 40 <= rsi <= 65 and vol_avg > 500000',
+     'pattern_name': 'SWING: UPTREND SEHAT'},
+]
+
+_COMPARE = {ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt,
+            ast.LtE: operator.le, ast.Eq: operator.eq, ast.NotEq: operator.ne}
+_ARITH = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+
+class Screen:
+    def __init__(self, name, scanner, when, pattern_name):
+        self.name = name
+        self.scanner = scanner
+        self.when = when
+        self.pattern_name = pattern_name
+        self.needs = set()
+        node = ast.parse(when, mode='eval').body
+        if not isinstance(node, (ast.BoolOp, ast.Compare)) and not (
+                isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not)):
+            raise ValueError(f"Screen {name}: ekspresi harus berupa kondisi (perbandingan / and / or / not)")
+        self.fn = self._compile(node)
+
+    def _compile(self, node):
+        """Node AST -> fungsi(kolom) yang mengembalikan array NumPy. Node lain ditolak."""
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(value) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return lambda cols: functools.reduce(combine, [part(cols) for part in parts])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            inner = self._compile(node.operand)
+            return lambda cols: np.logical_not(inner(cols))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            inner = self._compile(node.operand)
+            return lambda cols: -inner(cols)
+        if isinstance(node, ast.Compare) and all(type(op) in _COMPARE for op in node.ops):
+            # Chained: 40 <= rsi <= 65 -> (40 <= rsi) & (rsi <= 65)
+            operands = [self._compile(node.left)] + [self._compile(c) for c in node.comparators]
+            ops = [_COMPARE[type(op)] for op in node.ops]
+
+            def compare(cols):
+                values = [operand(cols) for operand in operands]
+                with np.errstate(invalid='ignore'):
+                    checks = [op(values[i], values[i + 1]) for i, op in enumerate(ops)]
+                return functools.reduce(np.logical_and, checks)
+            return compare
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITH:
+            left, right, op = self._compile(node.left), self._compile(node.right), _ARITH[type(node.op)]
+
+            def arith(cols):
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    return op(left(cols), right(cols))
+            return arith
+        if isinstance(node, ast.Name) and node.id in INDICATORS:
+            self.needs.add(node.id)
+            return lambda cols: cols[node.id]
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = float(node.value)
+            return lambda cols: value
+        raise ValueError(f"Screen {self.name}: '{ast.unparse(node)}' tidak didukung")
+
+
+def parse(entries):
+    """List dict dari config -> list Screen. Screen yang rusak dilewati dengan peringatan."""
+    screens = []
+    for entry in entries:
+        if not entry.get('active', True):
+            continue
+        try:
+            screens.append(Screen(entry['name'], entry['scanner'], entry['when'], entry['pattern_name']))
+        except (KeyError, SyntaxError, ValueError) as e:
+            print(f"⚠️ Screen {entry.get('name', '?')} tidak valid, dilewati: {e!r}")
+    return screens
+
+
+_cache = {}  # path -> (mtime, list Screen)
+
+
+def load(scanner, path=None):
+    """Screen aktif untuk satu scanner ('gainers' / 'portfolio'), urut sesuai file."""
+    path = path or SCREENS_FILE
+    try:
+        mtime = os.path.getmtime(path)
+        if path not in _cache or _cache[path][0] != mtime:
+            with open(path) as f:
+                _cache[path] = (mtime, parse(json.load(f).get('screens', [])))
+        screens = _cache[path][1]
+    except FileNotFoundError:
+        screens = []
+    except (OSError, ValueError) as e:
+        print(f"⚠️ {path} gagal dibaca ({e}), pakai screen bawaan.")
+        screens = []
+
+    selected = [screen for screen in screens if screen.scanner == scanner]
+    return selected or [screen for screen in parse(DEFAULT_SCREENS) if screen.scanner == scanner]
+
+
+def apply(table, screens):
+    """
+    Evaluasi semua screen atas seluruh tabel sekaligus.
+    Return baris yang cocok dengan minimal 1 screen + kolom pattern_name & screen.
+    """
+    needs = set().union(*(screen.needs for screen in screens)) if screens else set()
+    missing = needs - set(table.columns)
+    if missing:
+        skipped = [s.name for s in screens if s.needs & missing]
+        print(f"⚠️ Kolom {sorted(missing)} tidak ada di tabel, screen {skipped} dilewati.")
+        screens = [s for s in screens if not s.needs & missing]
+
+    # Kolom bersama diambil sekali untuk semua screen
+    cols = {name: table[name].to_numpy(dtype=float) for name in needs - missing}
+    matched = np.full(len(table), -1)
+    for i, screen in enumerate(screens):
+        hit = np.broadcast_to(screen.fn(cols), matched.shape) & (matched == -1)
+        matched[hit] = i
+        metrics.inc('screen_matches_total', int(hit.sum()), screen=screen.name)
+
+    result = table[matched >= 0].copy()
+    picked = matched[matched >= 0]
+    result['pattern_name'] = [screens[i].pattern_name for i in picked]
+    result['screen'] = [screens[i].name for i in picked]
+    return result
@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from dotenv import load_dotenv
+import metrics
+import ohlcv_cache
+
+# --- SCAN UNIVERSE BESAR: SHARD + PROCESS POOL ---
+# Universe (misal ~900 emiten IDX) dipecah jadi shard. Tiap shard diproses di proses
+# terpisah: ambil OHLCV (lewat ohlcv_cache) lalu hitung tabel indikator. Tabel per shard
+# digabung di proses utama untuk ranking / screening. Shard yang gagal hanya
+# menandai ticker-nya sebagai error; shard lain tetap dipakai.
+# Process pool hanya dipakai kalau memang ada bar yang perlu di-download (cache segar ->
+# semua shard jalan in-process, start worker lebih mahal dari hitungannya). Pool dibuat
+# sekali per proses dan dipakai ulang antar scan (mode daemon).
+
+load_dotenv()
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "0")) or os.cpu_count() or 1
+# Ukuran shard maksimum; universe kecil (< 2x minimum) tetap 1 shard tanpa process pool
+SCAN_SHARD_SIZE = int(os.getenv("SCAN_SHARD_SIZE", "150"))
+SCAN_MIN_SHARD_SIZE = int(os.getenv("SCAN_MIN_SHARD_SIZE", "50"))
+# Worker tidak di-fork: proses scanner sudah punya thread (pool AI, dispatcher Telegram,
+# koneksi DB) dan fork dari proses multi-thread bisa mewarisi lock yang sedang terkunci.
+SCAN_START_METHOD = os.getenv("SCAN_START_METHOD") or (
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+# Dijalankan sekali di tiap proses worker baru (fungsi level modul + argumen yang bisa di-pickle).
+# Patch global di proses utama tidak ikut ke worker; benchmark memakai ini untuk yfinance palsu.
+WORKER_INITIALIZER = None
+WORKER_INITARGS = ()
+
+_pool = None  # (konfigurasi, ProcessPoolExecutor) yang dipakai ulang antar scan
+
+
+def _get_pool(workers, preload=()):
+    global _pool
+    key = (workers, SCAN_START_METHOD, WORKER_INITIALIZER, WORKER_INITARGS)
+    if _pool is not None and _pool[0] != key:
+        shutdown_pool()
+    if _pool is None:
+        context = multiprocessing.get_context(SCAN_START_METHOD)
+        if SCAN_START_METHOD == 'forkserver':
+            # Modul berat (pandas, yfinance, client Gemini di modul scanner) di-import sekali di
+            # proses forkserver; worker hasil fork-nya tidak perlu import ulang satu per satu.
+            # Hanya berlaku saat forkserver pertama kali jalan di proses ini.
+            context.set_forkserver_preload(list(dict.fromkeys(
+                ['__main__', 'ohlcv_cache', 'indicators', 'indicator_state', *preload])))
+        _pool = (key, ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                          initializer=WORKER_INITIALIZER, initargs=WORKER_INITARGS))
+    return _pool[1]
+
+
+def shutdown_pool():
+    """Hentikan process pool (misal sebelum konfigurasi worker diganti)."""
+    global _pool
+    if _pool is not None:
+        _pool[1].shutdown(cancel_futures=True)
+        _pool = None
+
+
+def make_shards(tickers, shard_size=None, workers=None, min_size=None):
+    """Sebisa mungkin 1 shard per worker, tapi tiap shard antara min_size dan shard_size ticker."""
+    shard_size = shard_size or SCAN_SHARD_SIZE
+    workers = workers or SCAN_WORKERS
+    min_size = min_size or SCAN_MIN_SHARD_SIZE
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return []
+    count = max(-(-len(tickers) // max(1, shard_size)), min(workers, len(tickers) // max(1, min_size)), 1)
+    size = -(-len(tickers) // count)
+    return [tickers[i:i + size] for i in range(0, len(tickers), size)]
+
+
+def _shard_worker(args):
+    """Jalan di proses worker. Return (tabel, error per ticker, waktu per tahap, counter metrik)."""
+    tickers, compute, period, interval = args
+    run = metrics.RunRecorder('shard')
+    try:
+        with run.stage('fetch'):
+            history, errors = ohlcv_cache.get_history(tickers, period=period, interval=interval)
+        with run.stage('indicators'):
+            table = compute(history)
+    finally:
+        run.close()
+    return table, errors, run.stages, run.counters
+
+
+def scan_shards(tickers, compute, period, interval='1d', run=None, shard_size=None, workers=None):
+    """
+    compute(history) -> DataFrame 1 baris per ticker (misal indicators.build_indicator_table).
+    compute harus fungsi level modul (dikirim ke proses lain lewat pickle).
+    run: metrics.RunRecorder scanner. Tanpa process pool, waktu fetch / indicators masuk ke
+    tahap run; dengan process pool, wall time masuk tahap 'shards'.
+    Return: (tabel gabungan semua shard, dict error per ticker)
+    """
+    workers = workers or SCAN_WORKERS
+    shards = make_shards(tickers, shard_size, workers)
+    jobs = [(shard, compute, period, interval) for shard in shards]
+    tables, errors, failed = [], {}, 0
+
+    parallel = workers > 1 and len(jobs) > 1
+    if parallel:
+        # Yang di-paralel-kan terutama download; bar sudah segar semua -> cukup in-process
+        parallel = len(ohlcv_cache.stale_tickers(tickers, period, interval)) >= 2 * SCAN_MIN_SHARD_SIZE
+
+    def collect(shard, result=None, error=None):
+        nonlocal failed
+        if error is not None:
+            failed += 1
+            print(f"   ❌ Shard {shard[0]}..{shard[-1]} ({len(shard)} ticker) gagal: {error}")
+            errors.update({ticker: f"Shard gagal: {error}" for ticker in shard})
+            return
+        table, shard_errors, stages, counters = result
+        tables.append(table)
+        errors.update(shard_errors)
+        if run is None:
+            return
+        run.merge(counters)
+        for stage, seconds in stages.items():
+            if parallel:
+                # Tahap shard tumpang tindih antar proses -> dicatat sebagai jumlah CPU-detik
+                run.count(f"shard_{stage}_seconds", seconds)
+            else:
+                run.stages[stage] = run.stages.get(stage, 0.0) + seconds
+
+    started = time.perf_counter()
+    if parallel:
+        pending = jobs
+        # Kalau satu proses worker mati (misal kehabisan memori), pool rusak dan semua shard
+        # yang belum selesai ikut gagal -> shard tersebut dicoba sekali lagi di pool baru
+        for attempt in range(2):
+            broken, pool_broken = [], False
+            try:
+                pool = _get_pool(workers, preload=[compute.__module__])
+                futures = [pool.submit(_shard_worker, job) for job in pending]
+            except BrokenProcessPool:
+                futures = None  # worker mati saat pool menganggur (antar scan di mode daemon)
+            for i, job in enumerate(pending):
+                try:
+                    if futures is None:
+                        raise BrokenProcessPool("process pool rusak")
+                    collect(job[0], futures[i].result())
+                except BrokenProcessPool as e:
+                    pool_broken = True
+                    if attempt == 0:
+                        broken.append(job)
+                    else:
+                        collect(job[0], error=repr(e))
+                except Exception as e:
+                    collect(job[0], error=repr(e))
+            if pool_broken:
+                shutdown_pool()  # scan berikutnya dapat pool baru
+            if not broken:
+                break
+            print(f"   ⚠️ Process pool rusak, {len(broken)} shard diulang...")
+            pending = broken
+    else:
+        for shard, job in zip(shards, jobs):
+            try:
+                collect(shard, _shard_worker(job))
+            except Exception as e:
+                collect(shard, error=repr(e))
+
+    elapsed = time.perf_counter() - started
+    if run is not None:
+        run.count('shards', len(shards))
+        run.count('shards_failed', failed)
+        if parallel:
+            run.stages['shards'] = run.stages.get('shards', 0.0) + elapsed
+    processes = min(workers, len(jobs)) if parallel else 1
+    print(f"   🧩 {len(shards)} shard ({processes} proses), {failed} gagal, {elapsed:.1f} detik")
+
+    if not tables:
+        # Semua shard gagal / universe kosong: tabel kosong dengan kolom yang sama dari compute
+        placeholder = pd.DataFrame(index=pd.DatetimeIndex([]), dtype=float,
+                                   columns=pd.MultiIndex.from_product([ohlcv_cache.FIELDS, ['-']]))
+        return compute(placeholder).iloc[0:0], errors
+    return pd.concat([t for t in tables if len(t)] or tables[:1]), errors
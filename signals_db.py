@@ -0,0 +1,169 @@
+import datetime
+import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import column, insert, table, text
+import metrics
+
+# --- PENYIMPANAN SINYAL KE detected_patterns ---
+# Semua hasil satu scan ditulis dengan SATU INSERT multi-baris dalam SATU transaksi.
+# Mode 'upsert' memakai kunci unik (ticker, scan_bucket) supaya cron yang tumpang tindih
+# atau di-retry tidak menulis sinyal yang sama dua kali. Mode 'append' (default) tetap
+# seperti dulu: scan_bucket dibiarkan NULL sehingga tidak pernah bentrok dengan index unik.
+# Di transaksi yang sama, latest_signals (1 baris per ticker) di-upsert supaya /api/signals
+# cukup membaca tabel kecil itu, bukan detected_patterns yang terus membesar.
+
+load_dotenv()
+SIGNAL_WRITE_MODE = os.getenv("SIGNAL_WRITE_MODE", "append")  # append | upsert
+SCAN_BUCKET_MINUTES = int(os.getenv("SCAN_BUCKET_MINUTES", "15"))
+
+detected_patterns = table(
+    'detected_patterns',
+    column('ticker'), column('pattern_name'), column('price'),
+    column('story'), column('created_at'), column('scan_bucket'),
+)
+
+latest_signals = table(
+    'latest_signals',
+    column('ticker'), column('pattern_name'), column('price'),
+    column('story'), column('created_at'), column('scan_rank'),
+)
+SIGNAL_COLUMNS = ('pattern_name', 'price', 'story', 'created_at')
+
+
+def sync_db_url(url):
+    """'postgres://' (format Heroku / Render) -> 'postgresql://' yang dikenali SQLAlchemy."""
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def scan_bucket(now=None, minutes=SCAN_BUCKET_MINUTES):
+    """Potong waktu ke slot scan (default 15 menit), dipakai sebagai kunci idempotensi."""
+    now = now or datetime.datetime.now()
+    floored = now.replace(minute=now.minute - now.minute % minutes, second=0, microsecond=0)
+    return floored.strftime('%Y-%m-%d %H:%M')
+
+
+def ensure_schema(conn):
+    """
+    Buat tabel detected_patterns kalau belum ada, dan tambahkan kolom id / scan_bucket
+    di tabel lama (yang dulu dibuat otomatis oleh pandas to_sql).
+    Menerima koneksi sync (bisa juga lewat AsyncConnection.run_sync).
+    """
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS detected_patterns (
+                id BIGSERIAL PRIMARY KEY,
+                ticker TEXT, pattern_name TEXT, price DOUBLE PRECISION,
+                story TEXT, created_at TIMESTAMP, scan_bucket TEXT
+            )
+        """))
+        conn.execute(text("ALTER TABLE detected_patterns ADD COLUMN IF NOT EXISTS id BIGSERIAL"))
+        conn.execute(text("ALTER TABLE detected_patterns ADD COLUMN IF NOT EXISTS scan_bucket TEXT"))
+    else:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS detected_patterns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ticker TEXT, pattern_name TEXT, price REAL,
+                story TEXT, created_at TIMESTAMP, scan_bucket TEXT
+            )
+        """))
+        existing = {row[1] for row in conn.execute(text("PRAGMA table_info(detected_patterns)"))}
+        if 'scan_bucket' not in existing:
+            conn.execute(text("ALTER TABLE detected_patterns ADD COLUMN scan_bucket TEXT"))
+
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_detected_patterns_ticker_bucket "
+        "ON detected_patterns (ticker, scan_bucket)"
+    ))
+
+    price_type = "DOUBLE PRECISION" if conn.dialect.name == 'postgresql' else "REAL"
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS latest_signals (
+            ticker TEXT PRIMARY KEY, pattern_name TEXT, price {price_type},
+            story TEXT, created_at TIMESTAMP, scan_rank INTEGER
+        )
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_latest_signals_created_at ON latest_signals (created_at DESC, scan_rank)"
+    ))
+
+    # Tabel baru di database lama: isi sekali dari sinyal terakhir per ticker
+    if conn.execute(text("SELECT 1 FROM latest_signals LIMIT 1")).first() is None:
+        conn.execute(text("""
+            INSERT INTO latest_signals (ticker, pattern_name, price, story, created_at, scan_rank)
+            SELECT ticker, pattern_name, price, story, created_at, id FROM detected_patterns d
+            WHERE ticker IS NOT NULL AND id = (SELECT MAX(id) FROM detected_patterns WHERE ticker = d.ticker)
+            ON CONFLICT (ticker) DO NOTHING
+        """))
+
+
+def _upsert(conn, target, rows, keys, columns=SIGNAL_COLUMNS):
+    if conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif conn.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise RuntimeError(f"Mode upsert belum didukung untuk {conn.dialect.name}")
+
+    stmt = dialect_insert(target).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: stmt.excluded[name] for name in columns},
+    )
+
+
+def _latest_rows(rows):
+    """
+    1 baris per ticker (yang terakhir di list menang).
+    scan_rank = urutan baris di scan (ranking top gainers), untuk ORDER BY di /api/signals.
+    """
+    latest = {}
+    for scan_rank, row in enumerate(rows):
+        latest[row['ticker']] = {'ticker': row['ticker'], 'scan_rank': scan_rank,
+                                 **{name: row.get(name) for name in SIGNAL_COLUMNS}}
+    return list(latest.values())
+
+
+_schema_ready = set()  # URL engine yang skemanya sudah dicek di proses ini
+
+
+def ensure_schema_once(engine):
+    """
+    ensure_schema sekali per engine per proses, di transaksi sendiri.
+    ALTER TABLE mengambil lock ACCESS EXCLUSIVE di Postgres: jangan diulang di tiap transaksi tulis.
+    """
+    if engine.url in _schema_ready:
+        return
+    with engine.begin() as conn:
+        ensure_schema(conn)
+    _schema_ready.add(engine.url)
+
+
+def save_signals(engine, rows, mode=SIGNAL_WRITE_MODE):
+    """
+    Tulis semua baris sinyal + upsert latest_signals dalam satu transaksi.
+    rows: list dict berisi ticker, pattern_name, price, story, created_at (+ scan_bucket opsional).
+    Return: (jumlah baris, durasi detik)
+    """
+    if not rows:
+        return 0, 0.0
+
+    started = time.perf_counter()
+    # Mode append = perilaku lama (duplikat dibiarkan), scan_bucket hanya diisi untuk upsert
+    bucket = scan_bucket() if mode == 'upsert' else None
+    rows = [{**row, 'scan_bucket': row.get('scan_bucket') or bucket} for row in rows]
+
+    ensure_schema_once(engine)
+    with engine.begin() as conn:
+        if mode == 'upsert':
+            conn.execute(_upsert(conn, detected_patterns, rows, ['ticker', 'scan_bucket']))
+        else:
+            conn.execute(insert(detected_patterns).values(rows))
+        conn.execute(_upsert(conn, latest_signals, _latest_rows(rows), ['ticker'], SIGNAL_COLUMNS + ('scan_rank',)))
+
+    elapsed = time.perf_counter() - started
+    metrics.observe('db_write_seconds', elapsed, mode=mode)
+    metrics.inc('db_rows_written_total', len(rows), mode=mode)
+    return len(rows), elapsed
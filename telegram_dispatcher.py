@@ -0,0 +1,147 @@
+import os
+import random
+import time
+import requests
+from dotenv import load_dotenv
+from rate_limit import TokenBucket
+import metrics
+
+# --- DISPATCHER TELEGRAM ---
+# 1. Satu requests.Session (koneksi HTTP dipakai ulang)
+# 2. Tempo kirim diatur token bucket per chat (bukan time.sleep tetap)
+# 3. Beberapa laporan kandidat digabung jadi sesedikit mungkin pesan (maks 4096 karakter)
+# 4. Kegagalan kirim dicatat dan dilaporkan di akhir sesi
+# TELEGRAM_API_URL bisa diarahkan ke server HTTP lokal untuk testing.
+
+load_dotenv()
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_MSGS_PER_MINUTE = float(os.getenv("TELEGRAM_MSGS_PER_MINUTE", "20"))
+TELEGRAM_BURST = float(os.getenv("TELEGRAM_BURST", "3"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "15"))
+TELEGRAM_MAX_CHARS = 4096
+SEPARATOR = "\n\n"
+
+
+def _split_long(part, limit):
+    """Pecah satu teks yang lebih panjang dari limit, sebisa mungkin di batas baris."""
+    pieces, current = [], ""
+    for line in part.split("\n"):
+        while len(line) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            pieces.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def pack_messages(parts, limit=TELEGRAM_MAX_CHARS, separator=SEPARATOR):
+    """Gabungkan bagian-bagian pesan (urutan tetap) ke sesedikit mungkin pesan <= limit karakter."""
+    messages, current = [], ""
+    for part in parts:
+        part = part.strip("\n")
+        if not part:
+            continue
+        for piece in (_split_long(part, limit) if len(part) > limit else [part]):
+            candidate = f"{current}{separator}{piece}" if current else piece
+            if len(candidate) > limit:
+                messages.append(current)
+                current = piece
+            else:
+                current = candidate
+    if current:
+        messages.append(current)
+    return messages
+
+
+class TelegramDispatcher:
+    def __init__(self, token, chat_id, base_url=TELEGRAM_API_URL,
+                 rate_per_minute=TELEGRAM_MSGS_PER_MINUTE, burst=TELEGRAM_BURST,
+                 max_retries=TELEGRAM_MAX_RETRIES, timeout=TELEGRAM_TIMEOUT):
+        self.url = f"{base_url.rstrip('/')}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.session = requests.Session()
+        self.bucket = TokenBucket(rate_per_minute, capacity=burst)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.sent = 0
+        self.failures = []  # list (potongan pesan, alasan)
+
+    def send(self, text, parse_mode="Markdown"):
+        """Kirim satu pesan. Return True kalau berhasil."""
+        # disable_web_page_preview=True agar link stockbit tidak bikin preview gambar besar
+        payload = {
+            "chat_id": self.chat_id,
+            "text": text,
+            "disable_web_page_preview": True,
+        }
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+
+        reason = "unknown"
+        for attempt in range(self.max_retries):
+            if attempt:
+                metrics.inc('telegram_retries_total')
+            self.bucket.acquire()
+            try:
+                with metrics.timed('telegram_send_seconds'):
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                reason = str(e)
+                time.sleep(random.uniform(0, 2 ** attempt))
+                continue
+
+            if response.ok:
+                self.sent += 1
+                metrics.inc('telegram_messages_total', status="ok")
+                return True
+
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            reason = f"HTTP {response.status_code}: {data.get('description', response.text[:200])}"
+
+            if response.status_code == 429:
+                # Telegram memberi tahu berapa detik harus menunggu
+                retry_after = (data.get("parameters") or {}).get("retry_after", 2 ** attempt)
+                print(f"   ⏳ Telegram limit, tunggu {retry_after} detik...")
+                time.sleep(float(retry_after))
+            elif response.status_code == 400 and "parse" in reason.lower() and "parse_mode" in payload:
+                # Markdown dari AI kadang tidak valid -> kirim ulang sebagai teks biasa
+                payload.pop("parse_mode")
+            elif response.status_code >= 500:
+                time.sleep(random.uniform(0, 2 ** attempt))
+            else:
+                break
+
+        self.failures.append((text[:60], reason))
+        metrics.inc('telegram_messages_total', status="failed")
+        print(f"   ❌ Gagal kirim Telegram: {reason}")
+        return False
+
+    def send_batch(self, parts, parse_mode="Markdown"):
+        """Gabung lalu kirim semua bagian. Return (jumlah terkirim, jumlah gagal)."""
+        ok = failed = 0
+        for message in pack_messages(parts):
+            if self.send(message, parse_mode=parse_mode):
+                ok += 1
+            else:
+                failed += 1
+        print(f"   ✅ {ok} pesan terkirim" + (f", ❌ {failed} gagal" if failed else "") + ".")
+        return ok, failed
+
+    def report(self):
+        """Ringkasan pengiriman sejak dispatcher dibuat."""
+        lines = [f"📨 Telegram: {self.sent} terkirim, {len(self.failures)} gagal"]
+        lines += [f"   - {snippet!r}: {reason}" for snippet, reason in self.failures]
+        return "\n".join(lines)
@@ -0,0 +1,85 @@
+import os
+import re
+from dotenv import load_dotenv
+
+# --- UNIVERSE TICKER (FILE / TABEL) ---
+# Daftar saham tidak lagi harus hard-coded. Sumber dicek berurutan:
+# 1. Env khusus scanner (GAINERS_UNIVERSE / PORTFOLIO_UNIVERSE)
+# 2. UNIVERSE_FILE (dipakai kedua scanner)
+# 3. Daftar bawaan di scanner (DAFTAR_50 / WATCHLIST)
+# Nilai env berupa path file (1 ticker per baris, atau CSV dengan ticker di kolom
+# pertama; baris '#' diabaikan) atau 'table:<nama_tabel>' untuk SELECT ticker dari DB_URL.
+
+load_dotenv()
+UNIVERSE_FILE = os.getenv("UNIVERSE_FILE")
+
+_TABLE_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+
+class TickerNotFound(LookupError):
+    """Ticker tidak dikenal / datanya belum cukup untuk dianalisa."""
+
+
+class DataUnavailable(RuntimeError):
+    """Data harga gagal diambil (yfinance error / timeout / refresh gagal), bisa dicoba lagi."""
+
+
+def normalize(ticker):
+    """'bbri' / 'BBRI' / 'BBRI.JK' -> 'BBRI.JK' (ticker IDX)."""
+    ticker = ticker.strip().upper()
+    return ticker if "." in ticker else f"{ticker}.JK"
+
+
+def read_file(path):
+    tickers = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            ticker = line.split(",")[0].strip().strip('"')
+            if ticker and ticker.lower() not in ("ticker", "kode", "symbol"):
+                tickers.append(normalize(ticker))
+    return tickers
+
+
+def read_table(name, db_url=None):
+    """Kolom 'ticker' dari tabel DB (misal hasil sinkronisasi daftar emiten IDX)."""
+    from sqlalchemy import create_engine, text
+    import signals_db
+
+    if not _TABLE_NAME.match(name):
+        raise ValueError(f"Nama tabel universe tidak valid: {name}")
+    db_url = db_url or os.getenv("DB_URL")
+    if not db_url:
+        raise ValueError("DB_URL kosong, universe dari tabel tidak bisa dibaca")
+
+    engine = create_engine(signals_db.sync_db_url(db_url))
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT ticker FROM {name} WHERE ticker IS NOT NULL ORDER BY ticker"))
+            return [normalize(row[0]) for row in rows if str(row[0]).strip()]
+    finally:
+        engine.dispose()
+
+
+def load(env_name, default):
+    """Universe untuk satu scanner; kosong / gagal dibaca -> daftar bawaan."""
+    source = os.getenv(env_name) or UNIVERSE_FILE
+    if not source:
+        return list(default)
+    try:
+        if source.startswith("table:"):
+            tickers = read_table(source[len("table:"):])
+        else:
+            tickers = read_file(source)
+    except Exception as e:
+        print(f"⚠️ Universe {source} gagal dibaca ({e}), pakai daftar bawaan.")
+        return list(default)
+
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        print(f"⚠️ Universe {source} kosong, pakai daftar bawaan.")
+        return list(default)
+    print(f"📋 Universe {source}: {len(tickers)} ticker")
+    return tickers